@@ -1,27 +1,35 @@
-from typing import List
+import os
+import json
+from typing import AsyncIterator, List, Tuple, Union
+
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch, Q
+from rest_framework.utils.encoders import JSONEncoder
 
 from accounts.models import User
 from game.models import Game, GamePlayer, SubGame
 from game.serializers import GameSerializer, GamePlayerSerializer, SubGameSerializer
 
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", "20"))
+HISTORY_MAX_PAGE_SIZE = int(os.environ.get("HISTORY_MAX_PAGE_SIZE", "100"))
+HISTORY_CHUNK_SIZE = int(os.environ.get("HISTORY_CHUNK_SIZE", "100"))
+
 
 class GameHistory:
-    def __init__(self, game: Game, game_player: GamePlayer) -> None:
+    def __init__(
+        self, game: Game, game_player: GamePlayer, subgames: List[SubGame]
+    ) -> None:
         self.game = game
         self.game_player = game_player
-
-        self.subgames: List[SubGame] = [
-            subgame
-            for subgame in game.sub_games.all()
-            if game_player in (subgame.player_a, subgame.player_b)
-        ]
+        # subgames the player played in
+        self.subgames = subgames
 
     def serialize_subgame(self, subgame: SubGame) -> dict:
         result = SubGameSerializer(subgame).data
 
         result["game_player_won"] = (
-            subgame.winner == "A" and subgame.player_a.id == self.game_player.id
-        ) or (subgame.winner == "B" and subgame.player_b.id == self.game_player.id)
+            subgame.winner == "A" and subgame.player_a_id == self.game_player.id
+        ) or (subgame.winner == "B" and subgame.player_b_id == self.game_player.id)
 
         return result
 
@@ -33,15 +41,69 @@ class GameHistory:
         }
 
 
-def get_game_histories_of_user(user: User):
-    result: List[GameHistory] = []
+# Players of the user in its finished games (i.e. games listed in user.games),
+# with the game, the profile and the user's own subgames loaded up front:
+# 2 queries for any number of games
+def get_game_players_of_user(user: User):
+    subgames = SubGame.objects.filter(
+        Q(player_a__user=user) | Q(player_b__user=user)
+    ).order_by("id")
+    return (
+        GamePlayer.objects.filter(user=user, game__users=user)
+        .select_related("game", "user__profile")
+        .prefetch_related(
+            Prefetch("game__sub_games", queryset=subgames, to_attr="user_subgames")
+        )
+        .order_by("game_id")
+    )
+
+
+def get_game_history(game_player: GamePlayer) -> GameHistory:
+    game = game_player.game
+    return GameHistory(game, game_player, game.user_subgames)
+
+
+def get_game_histories_of_user(user: User) -> List[GameHistory]:
+    return [
+        get_game_history(game_player) for game_player in get_game_players_of_user(user)
+    ]
+
+
+# Keyset page: up to `limit` games before the game_id `cursor`, newest first.
+# next_cursor is None on the last page.
+def get_game_histories_page(
+    user: User, cursor: Union[None, int], limit: int
+) -> Tuple[List[GameHistory], Union[None, int]]:
+    game_players = get_game_players_of_user(user).order_by("-game_id")
+    if cursor is not None:
+        game_players = game_players.filter(game_id__lt=cursor)
+    game_players = list(game_players[: limit + 1])
+
+    next_cursor = game_players[limit - 1].game_id if len(game_players) > limit else None
+    histories = [get_game_history(game_player) for game_player in game_players[:limit]]
+    return histories, next_cursor
 
-    for game in user.games.all():
-        game_player = GamePlayer.objects.filter(user=user, game=game).first()
 
-        if not game_player:
-            continue
+def serialize_game_histories_page(
+    user: User, cursor: Union[None, int], limit: int
+) -> Tuple[List[dict], Union[None, int]]:
+    histories, next_cursor = get_game_histories_page(user, cursor, limit)
+    return [history.to_dict() for history in histories], next_cursor
 
-        result.append(GameHistory(game, game_player))
 
-    return result
+# The whole history as a JSON array, newest first, fetched and sent chunk by chunk.
+# Each chunk is a keyset page of its own, thus no DB cursor (nor connection)
+# is held open while a slow client is being served.
+async def stream_game_histories(user: User, chunk_size: int) -> AsyncIterator[str]:
+    cursor = None
+    separator = "["
+    while True:
+        records, cursor = await sync_to_async(serialize_game_histories_page)(
+            user, cursor, chunk_size
+        )
+        for record in records:
+            yield separator + json.dumps(record, cls=JSONEncoder)
+            separator = ","
+        if cursor is None:
+            break
+    yield "]" if separator == "," else "[]"
@@ -1,5 +1,4 @@
 from dataclasses import dataclass
-from asgiref.sync import sync_to_async
 
 from django.db import models
 from django.contrib.auth.models import AbstractUser
@@ -27,8 +26,7 @@ class UserDataCache:
         }
 
 
-@sync_to_async
-def fetch_user_data_cache(user: User) -> UserDataCache:
+def get_user_data_cache(user: User) -> UserDataCache:
     return UserDataCache(
         user.intra_id,
         user.profile.nickname,
@@ -1,3 +1,128 @@
-from django.test import TestCase  # pylint: disable=unused-import
+import json
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from pong import settings
+from game.models import Game, GamePlayer, SubGame
+from .models import User, Profile
+from .game_history import get_game_histories_of_user
+from .game_stats import GameStats
+
+
+class GameHistoryTestCase(TestCase):
+    def setUp(self):
+        self.users = []
+        for idx in range(4):
+            user = User.objects.create(intra_id=f"user{idx}", username=f"user{idx}")
+            Profile.objects.create(
+                user=user, nickname=f"nick{idx}", email=f"user{idx}@example.com"
+            )
+            self.users.append(user)
+        self.user = self.users[0]
+
+        # user0 wins the first half of the dual games and loses the others
+        for idx in range(6):
+            self.create_dual(self.users[idx % 3 + 1], won=idx < 3)
+
+        # tournament: user0 beats user1, user2 beats user3, user2 wins the final
+        game = Game.objects.create(is_tournament=True, n_players=4)
+        players = self.create_players(game, self.users)
+        players[0].rank = 0
+        players[0].save()
+        self.create_subgame(game, 1, 0, players[0], players[1], "A")
+        self.create_subgame(game, 1, 1, players[2], players[3], "A")
+        self.create_subgame(game, 0, 0, players[0], players[2], "B")
+
+        # still in a lobby: not part of the history
+        game = Game.objects.create(is_tournament=False)
+        GamePlayer.objects.create(user=self.user, game=game)
+
+        self.client.cookies[settings.SIMPLE_JWT["AUTH_COOKIE"]] = str(
+            AccessToken.for_user(self.users[1])
+        )
+
+    def create_players(self, game, users):
+        players = [GamePlayer.objects.create(user=user, game=game) for user in users]
+        game.users.add(*users)
+        return players
+
+    def create_subgame(self, game, rank, idx_in_rank, player_a, player_b, winner):
+        SubGame.objects.create(
+            game=game,
+            rank=rank,
+            idx_in_rank=idx_in_rank,
+            player_a=player_a,
+            player_b=player_b,
+            winner=winner,
+        )
+
+    def create_dual(self, opponent, won):
+        game = Game.objects.create(is_tournament=False)
+        player_a, player_b = self.create_players(game, [self.user, opponent])
+        self.create_subgame(game, 0, 0, player_a, player_b, "A" if won else "B")
+
+    def test_constant_number_of_queries(self):
+        # players with games and profiles, subgames
+        with self.assertNumQueries(2):
+            histories = [
+                history.to_dict() for history in get_game_histories_of_user(self.user)
+            ]
+
+        self.assertEqual(len(histories), 7)
+        self.assertEqual(
+            [len(history["subgames"]) for history in histories], [1] * 6 + [2]
+        )
+        self.assertEqual(
+            [history["subgames"][0]["game_player_won"] for history in histories],
+            [True] * 3 + [False] * 3 + [True],
+        )
+        self.assertFalse(histories[-1]["subgames"][1]["game_player_won"])
+
+    def test_stats(self):
+        stats = GameStats(get_game_histories_of_user(self.user)).to_dict()
+        self.assertEqual(stats["n_dual_match"], 6)
+        self.assertEqual(stats["n_dual_wins"], 3)
+        self.assertEqual(stats["n_tournaments"], 1)
+
+    def get(self, **params):
+        return self.client.get(f"/api/accounts/history/{self.user.intra_id}/", params)
+
+    def test_keyset_pages(self):
+        # token user, user, players with games and profiles, subgames
+        with self.assertNumQueries(4):
+            first = self.get(limit=4).json()
+        self.assertEqual(len(first["data"]), 4)
+        cursor = first["pages"]["next_cursor"]
+        self.assertEqual(cursor, first["data"][-1]["game"]["game_id"])
+
+        with self.assertNumQueries(4):
+            second = self.get(limit=4, cursor=cursor).json()
+        self.assertEqual(len(second["data"]), 3)
+        self.assertIsNone(second["pages"]["next_cursor"])
+        game_ids = [history["game"]["game_id"] for history in first["data"]]
+        game_ids += [history["game"]["game_id"] for history in second["data"]]
+        self.assertEqual(game_ids, sorted(set(game_ids), reverse=True))
+
+        self.assertEqual(self.get(limit=0).status_code, 400)
+
+    def test_bare_list_by_default(self):
+        response = self.get().json()
+        self.assertIsInstance(response, list)
+        self.assertEqual(len(response), 7)
+        game_ids = [history["game"]["game_id"] for history in response]
+        self.assertEqual(game_ids, sorted(game_ids))
+
+    def test_stream(self):
+        expected = self.get(limit=100).json()["data"]
+        with mock.patch("accounts.views.HISTORY_CHUNK_SIZE", 3):
+            response = self.get(stream=1)
+        self.assertTrue(response.streaming)
+
+        # served asynchronously, as under ASGI
+        async def read():
+            return b"".join([part async for part in response])
+
+        self.assertEqual(json.loads(async_to_sync(read)()), expected)
@@ -6,6 +6,7 @@ from datetime import datetime
 
 from django.db.models import Q
 from django.core.files.storage import default_storage
+from django.http import StreamingHttpResponse
 from rest_framework.response import Response
 from rest_framework import status, permissions, serializers, mixins, viewsets
 from rest_framework.parsers import MultiPartParser, JSONParser
@@ -21,7 +22,14 @@ from game.models import Game
 from game.serializers import GameSerializer
 from friends.models import Friend
 from .models import User
-from .game_history import get_game_histories_of_user
+from .game_history import (
+    HISTORY_CHUNK_SIZE,
+    HISTORY_PAGE_SIZE,
+    HISTORY_MAX_PAGE_SIZE,
+    get_game_histories_of_user,
+    get_game_histories_page,
+    stream_game_histories,
+)
 from .game_stats import GameStats
 from .models import Profile
 from .serializers import (
@@ -29,7 +37,6 @@ from .serializers import (
     ProfileNotOwnerSerializer,
 )
 
-
 logger = logging.getLogger(f"{__package__}.{__name__}")
 
 
@@ -199,11 +206,40 @@ class HistoryViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
             user = User.objects.get(intra_id=kwargs["intra_id"])
             self.logger.debug(f"got User: {user}")
 
-            histories = get_game_histories_of_user(user)
+            if request.query_params.get("stream", None) in ("1", "true"):
+                return StreamingHttpResponse(
+                    stream_game_histories(user, HISTORY_CHUNK_SIZE),
+                    content_type="application/json",
+                )
+
+            cursor = request.query_params.get("cursor", None)
+            limit = request.query_params.get("limit", None)
+            if cursor is None and limit is None:
+                histories = get_game_histories_of_user(user)
+                self.logger.debug(f"result {histories}")
+
+                dict_histories = [history.to_dict() for history in histories]
+                return Response(data=dict_histories, status=status.HTTP_200_OK)
+
+            # keyset pages, only when asked for
+            cursor = int(cursor) if cursor else None
+            limit = int(limit) if limit else HISTORY_PAGE_SIZE
+            if not 0 < limit <= HISTORY_MAX_PAGE_SIZE:
+                raise CustomError(
+                    f"limit must be between 1 and {HISTORY_MAX_PAGE_SIZE}",
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                )
+
+            histories, next_cursor = get_game_histories_page(user, cursor, limit)
             self.logger.debug(f"result {histories}")
 
-            dict_histories = [history.to_dict() for history in histories]
-            return Response(data=dict_histories, status=status.HTTP_200_OK)
+            return Response(
+                data={
+                    "data": [history.to_dict() for history in histories],
+                    "pages": {"next_cursor": next_cursor, "limit": limit},
+                },
+                status=status.HTTP_200_OK,
+            )
         except Exception as e:
             raise CustomError(
                 e, "Profile", status_code=status.HTTP_400_BAD_REQUEST
@@ -11,6 +11,7 @@ from pong.utils import CustomError, wrap_data, CookieTokenAuthentication
 from pong import settings
 from accounts.serializers import UserSerializer, ProfileSerializer
 from accounts.models import User
+from socketcontrol.token_cache import TOKEN_USER_CACHE
 from .utils import get_token_for_user, set_cookie_response, get_response_data
 
 
@@ -41,6 +42,8 @@ class LogoutView(APIView):
                 refresh.blacklist()
         except Exception:
             pass
+        if request.user.is_authenticated:
+            TOKEN_USER_CACHE.invalidate_user(request.user.intra_id)
         response.delete_cookie(settings.SIMPLE_JWT["AUTH_COOKIE"])
         response.delete_cookie(settings.SIMPLE_JWT["AUTH_COOKIE_REFRESH"])
 
@@ -0,0 +1,67 @@
+# Measures what trace() costs on the livegame hot path while tracing is disabled.
+# usage: LOGLEVEL_TRACE_ENABLE=0 python benchmark_trace.py
+import timeit
+import logging
+import django
+
+django.setup()
+
+# pylint: disable=wrong-import-position
+from pong.settings import LOGLEVEL_TRACE_ENABLE
+from game.models import Game
+from livegame.subgame_config import get_default_subgame_config
+from livegame.trace_config import TRACE_ENABLED
+from livegame.SubGameSession.balltrack import BallTrack
+from livegame.SubGameSession.balltrack_segment import BallTrackSegment
+
+# pylint: enable=wrong-import-position
+
+N_RUNS = 100000
+
+logger = logging.getLogger("livegame.benchmark_trace")
+segment = BallTrackSegment(0.0, 0.0, 90.0, 300.0, 150.0, 500.0)
+
+
+# trace() before: message is formatted by the caller, then dropped
+def trace_eager(msg: str) -> None:
+    if LOGLEVEL_TRACE_ENABLE != "0":
+        logger.debug(f"[TRACE] {msg}")
+
+
+# trace() after: check hoisted to import time, %-style formatting on emit only
+def trace_lazy(msg: str, *args) -> None:
+    if TRACE_ENABLED:
+        logger.debug("[TRACE] " + msg, *args)
+
+
+def bench(name, func) -> None:
+    sec = timeit.timeit(func, number=N_RUNS)
+    print(f"{name:<40} {sec / N_RUNS * 1e9:10.1f} ns/call")
+
+
+def main():
+    print(f"TRACE_ENABLED={TRACE_ENABLED}, {N_RUNS} runs each")
+    bench("eager f-string with segment", lambda: trace_eager(f"{segment} is valid"))
+    bench("lazy args with segment", lambda: trace_lazy("%s is valid", segment))
+    bench("eager f-string with float", lambda: trace_eager(f"new_y: {1.5}"))
+    bench("lazy args with float", lambda: trace_lazy("new_y: %s", 1.5))
+
+    # the old wall-by-wall solver traced ~7 times per bounce, 4 of them with
+    # str(segment); the closed-form solver traces once per BallTrack
+    per_bounce_before = timeit.timeit(
+        lambda: [trace_eager(f"{segment} is valid") for _ in range(4)]
+        + [trace_eager(f"x_start {1.5} y_start {2.5}") for _ in range(3)],
+        number=N_RUNS,
+    )
+    print(
+        f"{'trace per bounce, before':<40} {per_bounce_before / N_RUNS * 1e9:10.1f} ns"
+    )
+    config = get_default_subgame_config(Game())
+    bench(
+        "whole BallTrack (5 bounces), after",
+        lambda: BallTrack(config, 0.0, 0.0, 300.0, 2000.0, 0.0),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Compares bytes on the wire and encode time of livegame track events,
+# JSON (default) against JSON delta and struct-packed binary (opt-ins).
+# usage: python benchmark_wire.py
+import timeit
+import django
+
+django.setup()
+
+# pylint: disable=wrong-import-position
+from socketio import packet
+from game.models import Game
+from livegame.livegame_namespace import LIVEGAME_NAMESPACE
+from livegame.subgame_config import get_default_subgame_config
+from livegame.SubGameSession.balltrack import BallTrack
+from livegame.SubGameSession.paddle import Paddle, Player
+from livegame.SubGameSession.sio_adapter import (
+    serialize_balltrack,
+    serialize_balltrack_delta,
+)
+from livegame.SubGameSession.wire_format import pack_balltrack, pack_paddle
+
+# pylint: enable=wrong-import-position
+
+N_RUNS = 20000
+# every subgame shares /livegame; B>F events reach its players through the
+# socket.io room of the subgame, so the payloads carry no subgame id
+NAMESPACE = LIVEGAME_NAMESPACE.namespace
+
+
+# what python-socketio actually writes for one emit, all engine.io frames
+def encode_event(event: str, data) -> list:
+    encoded = packet.Packet(
+        packet.EVENT, data=[event, data], namespace=NAMESPACE
+    ).encode()
+    return encoded if isinstance(encoded, list) else [encoded]
+
+
+def wire_len(frames: list) -> int:
+    return sum(
+        len(frame) if isinstance(frame, bytes) else len(frame.encode())
+        for frame in frames
+    )
+
+
+def bench(name: str, event: str, serialize, obj) -> None:
+    frames = encode_event(event, serialize(obj))
+    sec = timeit.timeit(lambda: encode_event(event, serialize(obj)), number=N_RUNS)
+    print(
+        f"{name:<36} {wire_len(frames):6d} bytes {len(frames)} frames "
+        f"{sec / N_RUNS * 1e6:8.2f} us/event"
+    )
+
+
+def main():
+    config = get_default_subgame_config(Game())
+    print(f"{N_RUNS} runs each")
+    for dy in (300.0, 3000.0, 30000.0):
+        balltrack = BallTrack(config, 0.0, 0.0, 300.0, dy, 1700000000.0)
+        label = f"ball, {balltrack.n_bounces} bounces"
+        bench(f"{label}, json", "update_track_ball", serialize_balltrack, balltrack)
+        bench(
+            f"{label}, json delta",
+            "update_track_ball",
+            serialize_balltrack_delta,
+            balltrack,
+        )
+        bench(f"{label}, binary", "update_track_ball", pack_balltrack, balltrack)
+
+    paddle = Paddle(config, Player.A, 1700000000.123)
+    bench("paddle, json", "update_track_paddle", Paddle.to_dict, paddle)
+    bench("paddle, binary", "update_track_paddle", pack_paddle, paddle)
+
+
+if __name__ == "__main__":
+    main()
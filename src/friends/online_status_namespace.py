@@ -2,8 +2,7 @@ import logging
 import socketio
 from asgiref.sync import sync_to_async
 
-from pong import settings
-from socketcontrol.events import get_user_by_token
+from socketcontrol.auth import get_user_from_environ
 
 
 @sync_to_async
@@ -21,16 +20,10 @@ class OnlineStatusNamespace(socketio.AsyncNamespace):
     async def on_connect(self, sid, environ):
         self.logger.debug(f"connect from sid {sid}")
         try:
-            cookies = environ.get("HTTP_COOKIE", "")
-            cookie_dict = dict(
-                item.split("=") for item in cookies.split("; ") if "=" in item
-            )
-            token = cookie_dict.get(settings.SIMPLE_JWT["AUTH_COOKIE"], None)
-            if token:
-                user = await get_user_by_token(token)
+            user = await get_user_from_environ(environ)
+            if user:
                 await update_online_sid(user, sid)
             else:
-                self.logger.warning("No token")
                 await self.disconnect(sid)
         except Exception as e:
             self.logger.error(f"Error in connect: {e}")
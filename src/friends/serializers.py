@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
 from accounts.models import User
+from socketcontrol.presence_registry import PRESENCE_REGISTRY
 from .models import Friend
 
 
@@ -42,9 +43,9 @@ class FriendSerializer(serializers.ModelSerializer):
             if filter_val == "friend" and instance.status == "friend":
                 ret["friend"].update(
                     {
-                        "is_online": User.objects.get(
-                            intra_id=ret["friend"]["intra_id"]
-                        ).is_online
+                        "is_online": PRESENCE_REGISTRY.is_online(
+                            ret["friend"]["intra_id"]
+                        )
                     }
                 )
 
@@ -1,3 +1,4 @@
+from django.db.models import Prefetch, Q
 from rest_framework import status
 
 from pong.utils import CustomError
@@ -5,16 +6,40 @@ from .models import GameRoom, GamePlayer
 from .serializers import GameRoomSerializer, GameSerializer, GamePlayerSerializer
 
 
+# Rooms with their game, host profile and players (ordered, with profiles)
+# loaded up front, in 2 queries for any number of rooms
+def get_game_rooms_with_players():
+    return GameRoom.objects.select_related("game", "host__profile").prefetch_related(
+        Prefetch(
+            "game__game_player",
+            queryset=GamePlayer.objects.select_related("user__profile").order_by("id"),
+            to_attr="ordered_players",
+        )
+    )
+
+
+# game_room from get_game_rooms_with_players(): no further query
+def serialize_game_room_with_players(game_room):
+    return {
+        "game": GameSerializer(game_room.game).data,
+        "room": GameRoomSerializer(game_room).data,
+        "players": GamePlayerSerializer(game_room.game.ordered_players, many=True).data,
+    }
+
+
+# games of the rooms the user hosts or plays in
+def get_room_game_ids_of_user(intra_id):
+    return set(
+        GameRoom.objects.filter(
+            Q(host_id=intra_id) | Q(game__game_player__user_id=intra_id)
+        ).values_list("game_id", flat=True)
+    )
+
+
 def get_single_game_room(game_room_id):
     try:
-        game_room = GameRoom.objects.get(id=game_room_id)
-        game = game_room.game
-        game_serializer = GameSerializer(game)
-        game_room_serializer = GameRoomSerializer(game_room)
-        data = {"game": game_serializer.data, "room": game_room_serializer.data}
-        players = game.game_player.all().order_by("id")
-        data.update({"players": GamePlayerSerializer(players, many=True).data})
-        return data
+        game_room = get_game_rooms_with_players().get(id=game_room_id)
+        return serialize_game_room_with_players(game_room)
     except Exception as e:
         raise CustomError(
             e, "game_room", status_code=status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,193 @@
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Set, Tuple, Union
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.http import parse_etags
+
+from accounts.models import User, Profile
+from .models import GameRoom, GamePlayer
+from .databaseio import (
+    get_game_rooms_with_players,
+    get_room_game_ids_of_user,
+    serialize_game_room_with_players,
+)
+
+logger = logging.getLogger(f"{__package__}.{__name__}")
+
+LOBBY_FILTERS = (None, "tournament", "dual")
+
+# (game_id, old entry, new entry, versions right after the change)
+LobbyChange = Tuple[int, Union[None, dict], Union[None, dict], Dict]
+
+
+def get_lobby_filter(entry: dict) -> str:
+    return "tournament" if entry["game"]["is_tournament"] else "dual"
+
+
+# In-memory snapshot of the lobby (GET /api/game/game_rooms/), keyed by game_id.
+# Every save/delete of a GameRoom or GamePlayer (room creation, join/leave,
+# game start, game end), or of the User / Profile of one of its players
+# (nickname, avatar), only marks its game dirty; the next read reloads and
+# re-serializes the dirty rooms alone, in 2 queries.
+# Each filter has its own version, bumped only when one of its rooms changed,
+# which the view turns into an ETag: a poll with no change costs no query.
+# Listeners (i.e. the /lobby namespace) are told when a room gets dirty and
+# receive every change found by a refresh, whoever triggered it; both are
+# called from any thread.
+class LobbySnapshot:
+    def __init__(self) -> None:
+        self.entries: Dict[int, dict] = {}
+        self.loaded = False
+        self.dirty: Set[int] = set()
+        self.versions: Dict[Union[None, str], int] = {key: 0 for key in LOBBY_FILTERS}
+        self.views: Dict[Union[None, str], List[dict]] = {}
+        # views run in worker threads, livegame DB helpers in the DB executor
+        self.lock = threading.Lock()
+        # versions restart with the process, ETags must not match across restarts
+        self.epoch = f"{int(time.time() * 1000):x}"
+        self.n_reloads = 0
+        self.dirty_listeners: List[Callable[[], None]] = []
+        self.change_listeners: List[Callable[[List[LobbyChange]], None]] = []
+
+    def invalidate(self, game_id: int) -> None:
+        with self.lock:
+            self.dirty.add(game_id)
+        for listener in self.dirty_listeners:
+            listener()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.loaded = False
+            self.dirty.clear()
+            self.views.clear()
+            for key in LOBBY_FILTERS:
+                self.versions[key] += 1
+
+    # brings the snapshot up to date, returns the changed rooms
+    def refresh(self) -> List[LobbyChange]:
+        with self.lock:
+            changes = self.reload_dirty()
+            # still locked: listeners see the changes in version order
+            if changes:
+                for listener in self.change_listeners:
+                    listener(changes)
+        return changes
+
+    # lock must be held
+    def reload_dirty(self) -> List[LobbyChange]:
+        if not self.loaded:
+            self.load()
+            return []
+        if not self.dirty:
+            return []
+
+        dirty, self.dirty = self.dirty, set()
+        try:
+            game_rooms = get_game_rooms_with_players().filter(game_id__in=dirty)
+            new_entries = {
+                game_room.game_id: serialize_game_room_with_players(game_room)
+                for game_room in game_rooms
+            }
+        except Exception:
+            self.dirty |= dirty  # reloaded by the next refresh
+            raise
+        self.n_reloads += 1
+
+        changes = []
+        for game_id in dirty:
+            old = self.entries.pop(game_id, None)
+            new = new_entries.get(game_id, None)
+            if new is not None:
+                self.entries[game_id] = new
+            if old == new:
+                continue
+            for entry in (old, new):
+                if entry is not None:
+                    self.versions[get_lobby_filter(entry)] += 1
+            self.versions[None] += 1
+            changes.append((game_id, old, new, dict(self.versions)))
+        if changes:
+            self.views.clear()
+        return changes
+
+    # lock must be held
+    def load(self) -> None:
+        self.dirty.clear()
+        self.entries = {
+            game_room.game_id: serialize_game_room_with_players(game_room)
+            for game_room in get_game_rooms_with_players()
+        }
+        self.loaded = True
+        self.views.clear()
+        for key in LOBBY_FILTERS:
+            self.versions[key] += 1
+        self.n_reloads += 1
+
+    # rooms of the filter ordered by room id, with the version they belong to
+    def get(self, lobby_filter: Union[None, str]) -> Tuple[int, List[dict]]:
+        self.refresh()
+        with self.lock:
+            view = self.views.get(lobby_filter, None)
+            if view is None:
+                view = sorted(
+                    (
+                        entry
+                        for entry in self.entries.values()
+                        if lobby_filter is None
+                        or get_lobby_filter(entry) == lobby_filter
+                    ),
+                    key=lambda entry: entry["room"]["id"],
+                )
+                self.views[lobby_filter] = view
+            return self.versions[lobby_filter], view
+
+    def get_etag(self, lobby_filter: Union[None, str], version: int) -> str:
+        return f'W/"lobby-{lobby_filter or "all"}-{self.epoch}-{version}"'
+
+    def is_not_modified(self, if_none_match: str, etag: str) -> bool:
+        etags = [tag.removeprefix("W/") for tag in parse_etags(if_none_match)]
+        return "*" in etags or etag.removeprefix("W/") in etags
+
+    def to_dict(self) -> dict:
+        return {
+            "rooms": len(self.entries),
+            "dirty": len(self.dirty),
+            "reloads": self.n_reloads,
+            "versions": dict(self.versions),
+        }
+
+
+LOBBY_SNAPSHOT = LobbySnapshot()
+
+
+# invalidated only once committed, so that the reload sees the change
+def invalidate_game_on_commit(game_id: int) -> None:
+    transaction.on_commit(lambda: LOBBY_SNAPSHOT.invalidate(game_id))
+
+
+@receiver(post_save, sender=GameRoom)
+@receiver(post_delete, sender=GameRoom)
+@receiver(post_save, sender=GamePlayer)
+@receiver(post_delete, sender=GamePlayer)
+def invalidate_lobby(sender, instance, **kwargs):
+    invalidate_game_on_commit(instance.game_id)
+
+
+def invalidate_games_of_user(intra_id: str) -> None:
+    # not loaded yet: the first read loads every room anyway
+    if not LOBBY_SNAPSHOT.loaded:
+        return
+    for game_id in get_room_game_ids_of_user(intra_id):
+        LOBBY_SNAPSHOT.invalidate(game_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Profile)
+def invalidate_lobby_of_user(sender, instance, **kwargs):
+    intra_id = instance.pk if sender is User else instance.user_id
+    transaction.on_commit(lambda: invalidate_games_of_user(intra_id))
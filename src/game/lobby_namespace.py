@@ -0,0 +1,211 @@
+import os
+import asyncio
+import logging
+from typing import Dict, List, Tuple, Union
+from urllib.parse import parse_qs
+
+import socketio
+from asgiref.sync import sync_to_async
+
+from socketcontrol.auth import get_user_from_environ
+from .lobby import LOBBY_FILTERS, LOBBY_SNAPSHOT, LobbyChange, get_lobby_filter
+
+
+def parse_lobby_filter(value) -> Union[None, str]:
+    if value in LOBBY_FILTERS:
+        return value
+    return None
+
+
+def get_room_ids(entry: dict) -> dict:
+    return {"game_id": entry["game"]["game_id"], "room_id": entry["room"]["id"]}
+
+
+# The diff event a subscriber of `lobby_filter` gets for one change, if any
+def get_lobby_event(
+    lobby_filter: Union[None, str], old: Union[None, dict], new: Union[None, dict]
+) -> Union[None, Tuple[str, dict]]:
+    def matches(entry):
+        return entry is not None and (
+            lobby_filter is None or get_lobby_filter(entry) == lobby_filter
+        )
+
+    if matches(new):
+        return ("room_updated" if matches(old) else "room_added"), new
+    if matches(old):
+        return "room_removed", get_room_ids(old)
+    return None
+
+
+class LobbySubscriber:
+    def __init__(self, sid: str, lobby_filter: Union[None, str], max_queue: int):
+        self.sid = sid
+        self.lobby_filter = lobby_filter
+        self.version = -1
+        # None in the queue: send a full snapshot
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.resync = False
+        self.n_resyncs = 0
+        self.task: Union[None, asyncio.Task] = None
+        self.request_snapshot()
+
+    # a slow client does not let diffs pile up: once its queue is full,
+    # the queued diffs are dropped and it gets a snapshot instead
+    def push(self, version: int, event: str, data: dict) -> None:
+        if self.resync:  # the coming snapshot includes it
+            return
+        try:
+            self.queue.put_nowait((version, event, data))
+        except asyncio.QueueFull:
+            self.request_snapshot()
+
+    def request_snapshot(self) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.queue.task_done()
+        self.resync = True
+        self.n_resyncs += 1
+        self.queue.put_nowait(None)
+
+
+# Push-based lobby: clients subscribe instead of polling GET game_rooms.
+# A subscriber gets a snapshot of its filter first, then room_added,
+# room_updated and room_removed diffs, each with the version of its filter.
+# Diffs are driven by LOBBY_SNAPSHOT (see lobby.py), thus by every save or
+# delete of a GameRoom / GamePlayer, whichever code path made it.
+class LobbyNamespace(socketio.AsyncNamespace):
+    def __init__(self, max_queue: int, publish_delay: float) -> None:
+        super().__init__(namespace="/lobby")
+        self.logger = logging.getLogger(f"{__package__}.{__class__.__name__}")
+        self.max_queue = max_queue
+        self.publish_delay = publish_delay
+        self.subscribers: Dict[str, LobbySubscriber] = {}
+        self.loop: Union[None, asyncio.AbstractEventLoop] = None
+        self.publishing = False
+
+        LOBBY_SNAPSHOT.dirty_listeners.append(self.on_lobby_dirty)
+        LOBBY_SNAPSHOT.change_listeners.append(self.on_lobby_changes)
+
+    # SIO: F>B connect
+    async def on_connect(self, sid, environ):
+        self.logger.debug(f"connect from sid {sid}")
+        user = await get_user_from_environ(environ)
+        if not user:
+            return False
+
+        query = parse_qs(environ.get("QUERY_STRING", ""))
+        self.add_subscriber(sid, parse_lobby_filter(query.get("filter", [None])[0]))
+        return True
+
+    # SIO: F>B disconnect
+    async def on_disconnect(self, sid):
+        self.logger.debug(f"disconnect from sid {sid}")
+        self.remove_subscriber(sid)
+
+    # SIO: F>B set_filter
+    async def on_set_filter(self, sid, data):
+        subscriber = self.subscribers.get(sid, None)
+        if subscriber is None or not isinstance(data, dict):
+            return
+        subscriber.lobby_filter = parse_lobby_filter(data.get("filter", None))
+        subscriber.request_snapshot()
+
+    def add_subscriber(
+        self, sid: str, lobby_filter: Union[None, str]
+    ) -> LobbySubscriber:
+        self.loop = asyncio.get_running_loop()
+        subscriber = LobbySubscriber(sid, lobby_filter, self.max_queue)
+        subscriber.task = self.loop.create_task(self.run_subscriber(subscriber))
+        self.subscribers[sid] = subscriber
+        return subscriber
+
+    def remove_subscriber(self, sid: str) -> None:
+        subscriber = self.subscribers.pop(sid, None)
+        if subscriber is not None and subscriber.task is not None:
+            subscriber.task.cancel()
+
+    async def run_subscriber(self, subscriber: LobbySubscriber) -> None:
+        while True:
+            item = await subscriber.queue.get()
+            try:
+                if item is None:
+                    await self.emit_snapshot(subscriber)
+                    continue
+                version, event, data = item
+                if version <= subscriber.version:  # already in the snapshot
+                    continue
+                subscriber.version = version
+                # SIO: B>F room_added / room_updated / room_removed
+                await self.emit(
+                    event, {"version": version, "room": data}, to=subscriber.sid
+                )
+            except Exception as e:
+                self.logger.error(f"Error while sending lobby to {subscriber.sid}: {e}")
+            finally:
+                subscriber.queue.task_done()
+
+    async def emit_snapshot(self, subscriber: LobbySubscriber) -> None:
+        subscriber.resync = False
+        lobby_filter = subscriber.lobby_filter
+        version, rooms = await sync_to_async(LOBBY_SNAPSHOT.get)(lobby_filter)
+        subscriber.version = version
+        # SIO: B>F lobby_snapshot
+        await self.emit(
+            "lobby_snapshot",
+            {"filter": lobby_filter, "version": version, "rooms": rooms},
+            to=subscriber.sid,
+        )
+
+    # called from any thread (i.e. inside a DB write): must never raise
+    def call_soon_threadsafe(self, callback, *args) -> None:
+        if self.loop is None or not self.subscribers:
+            return
+        try:
+            self.loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError as e:  # loop closed
+            self.logger.warning(f"lobby update dropped: {e}")
+
+    def on_lobby_dirty(self) -> None:
+        self.call_soon_threadsafe(self.schedule_publish)
+
+    # called in version order
+    def on_lobby_changes(self, changes: List[LobbyChange]) -> None:
+        self.call_soon_threadsafe(self.dispatch, changes)
+
+    def schedule_publish(self) -> None:
+        if not self.publishing:
+            self.publishing = True
+            self.loop.create_task(self.publish())
+
+    # rooms changed in the meantime are reloaded together
+    async def publish(self) -> None:
+        await asyncio.sleep(self.publish_delay)
+        self.publishing = False
+        try:
+            await sync_to_async(LOBBY_SNAPSHOT.refresh)()
+        except Exception as e:
+            self.logger.error(f"Error while refreshing the lobby: {e}")
+
+    def dispatch(self, changes: List[LobbyChange]) -> None:
+        for _, old, new, versions in changes:
+            events = {
+                lobby_filter: get_lobby_event(lobby_filter, old, new)
+                for lobby_filter in LOBBY_FILTERS
+            }
+            for subscriber in self.subscribers.values():
+                event = events[subscriber.lobby_filter]
+                if event is not None:
+                    subscriber.push(versions[subscriber.lobby_filter], *event)
+
+    def to_dict(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "queued": sum(s.queue.qsize() for s in self.subscribers.values()),
+            "resyncs": sum(s.n_resyncs for s in self.subscribers.values()),
+        }
+
+
+LOBBY_NAMESPACE = LobbyNamespace(
+    max_queue=int(os.environ.get("LOBBY_QUEUE_SIZE", "32")),
+    publish_delay=float(os.environ.get("LOBBY_PUBLISH_DELAY", "0.1")),
+)
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from accounts.models import User, Profile
+from accounts.models import User
 from .models import Game, GameRoom, GamePlayer, SubGame
 
 
@@ -24,8 +24,7 @@ class GameRoomSerializer(serializers.ModelSerializer):
         }
 
     def get_host_nickname(self, obj):
-        profile = Profile.objects.get(user=obj.host)
-        return profile.nickname
+        return obj.host.profile.nickname
 
     def create(self, validated_data):
         host_user = validated_data.pop("host", None)
@@ -35,8 +34,7 @@ class GameRoomSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation["host"] = self.get_host_nickname(instance)
-        representation.pop("host_nickname", None)
+        representation["host"] = representation.pop("host_nickname")
 
         return representation
 
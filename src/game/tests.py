@@ -1,3 +1,252 @@
-from django.test import TestCase  # pylint: disable=unused-import
+import asyncio
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from pong import settings
+from accounts.models import User, Profile
+from socketcontrol.tests.fake_server import FakeServer
+from .models import Game, GameRoom, GamePlayer
+from .lobby import LOBBY_SNAPSHOT
+from .lobby_namespace import LobbyNamespace, LobbySubscriber
+
+
+class GameRoomListTestCase(TestCase):
+    def setUp(self):
+        LOBBY_SNAPSHOT.clear()
+        self.users = []
+        for idx in range(12):
+            user = User.objects.create(intra_id=f"user{idx}", username=f"user{idx}")
+            Profile.objects.create(
+                user=user,
+                nickname=f"nick{idx}",
+                email=f"user{idx}@example.com",
+                avatar=f"avatar{idx}",
+            )
+            self.users.append(user)
+
+        # 6 rooms of 2 players each, hosted by the first one
+        for idx in range(6):
+            host, guest = self.users[idx * 2 : idx * 2 + 2]
+            game = Game.objects.create(is_tournament=idx % 2 == 0, n_players=2)
+            GameRoom.objects.create(
+                host=host, game=game, title=f"room{idx}", join_players=2
+            )
+            for user in (host, guest):
+                GamePlayer.objects.create(
+                    user=user, game=game, nickname=user.profile.nickname
+                )
+
+        self.client.cookies[settings.SIMPLE_JWT["AUTH_COOKIE"]] = str(
+            AccessToken.for_user(self.users[0])
+        )
+
+    def get(self, **params):
+        return self.client.get("/api/game/game_rooms/", params)
+
+    def test_constant_number_of_queries(self):
+        # user, rooms with games and hosts, players with profiles
+        with self.assertNumQueries(3):
+            response = self.get(page_size=1)
+        self.assertEqual(len(response.json()["data"]), 1)
+
+        # served from the snapshot: only the user of the token is queried
+        for page_size in (3, 6):
+            with self.assertNumQueries(1):
+                response = self.get(page_size=page_size)
+            self.assertEqual(len(response.json()["data"]), page_size)
+
+        with self.assertNumQueries(1):
+            response = self.get(filter="tournament")
+        self.assertEqual(len(response.json()["data"]), 3)
+
+    def test_not_modified(self):
+        response = self.get(filter="dual")
+        etag = response["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/api/game/game_rooms/", {"filter": "dual"}, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+
+        # a tournament room changed: the dual listing keeps its ETag
+        with self.captureOnCommitCallbacks(execute=True):
+            GameRoom.objects.filter(title="room0").get().delete()
+        self.assertEqual(self.get(filter="dual")["ETag"], etag)
+        self.assertNotEqual(self.get()["ETag"], etag)
+        self.assertEqual(len(self.get().json()["data"]), 5)
+
+    def test_join_and_start_update_snapshot(self):
+        self.get()
+        room = GameRoom.objects.get(title="room1")
+        user = User.objects.create(intra_id="late", username="late")
+        Profile.objects.create(user=user, nickname="late", email="late@example.com")
+
+        # only the changed room is reloaded
+        with self.captureOnCommitCallbacks(execute=True):
+            GamePlayer.objects.create(user=user, game=room.game, nickname="late")
+            room.join_players = 3
+            room.is_playing = True
+            room.save()
+        with self.assertNumQueries(3):
+            response = self.get(page_size=2)
+
+        second = response.json()["data"][1]
+        self.assertEqual(second["room"]["join_players"], 3)
+        self.assertTrue(second["room"]["is_playing"])
+        self.assertEqual(second["players"][-1]["nickname"], "late")
+
+    def test_profile_change_updates_snapshot(self):
+        self.get()
+        host, guest = self.users[2:4]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            host.profile.nickname = "renamed"
+            host.profile.save()
+            guest.profile.avatar = "new_avatar"
+            guest.profile.save()
+        # only the room of both users is reloaded
+        self.assertEqual(
+            LOBBY_SNAPSHOT.dirty, {GameRoom.objects.get(title="room1").game_id}
+        )
+
+        second = self.get(page_size=2).json()["data"][1]
+        self.assertEqual(second["room"]["host"], "renamed")
+        self.assertEqual(second["players"][1]["avatar"], "new_avatar")
+
+    def test_failed_reload_keeps_dirty_rooms(self):
+        self.get()
+        room = GameRoom.objects.get(title="room1")
+        with self.captureOnCommitCallbacks(execute=True):
+            room.join_players = 3
+            room.save()
+
+        with mock.patch(
+            "game.lobby.get_game_rooms_with_players", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                LOBBY_SNAPSHOT.refresh()
+        self.assertEqual(LOBBY_SNAPSHOT.dirty, {room.game_id})
+        second = self.get(page_size=2).json()["data"][1]
+        self.assertEqual(second["room"]["join_players"], 3)
+
+    def test_content(self):
+        response = self.get(page_size=2)
+        second = response.json()["data"][1]
+        self.assertEqual(second["room"]["title"], "room1")
+        self.assertEqual(second["room"]["host"], "nick2")
+        self.assertFalse(second["game"]["is_tournament"])
+        self.assertEqual(
+            [(player["nickname"], player["avatar"]) for player in second["players"]],
+            [("nick2", "avatar2"), ("nick3", "avatar3")],
+        )
+
+
+class LobbyNamespaceTestCase(TestCase):
+    def setUp(self):
+        LOBBY_SNAPSHOT.clear()
+        users = []
+        for idx in range(3):
+            user = User.objects.create(intra_id=f"user{idx}", username=f"user{idx}")
+            Profile.objects.create(
+                user=user, nickname=f"nick{idx}", email=f"user{idx}@example.com"
+            )
+            users.append(user)
+        self.users = users
+        self.dual = GameRoom.objects.create(
+            host=users[0], game=Game.objects.create(is_tournament=False), title="dual"
+        )
+
+        self.namespace = LobbyNamespace(max_queue=4, publish_delay=0)
+        self.namespace.server = FakeServer()
+
+    def tearDown(self):
+        LOBBY_SNAPSHOT.dirty_listeners.remove(self.namespace.on_lobby_dirty)
+        LOBBY_SNAPSHOT.change_listeners.remove(self.namespace.on_lobby_changes)
+
+    def get_events(self, sid):
+        return [
+            (event, data)
+            for event, data, to, _ in self.namespace.server.emitted
+            if to == sid
+        ]
+
+    async def settle(self):
+        for _ in range(3):
+            await asyncio.sleep(0)
+            for subscriber in self.namespace.subscribers.values():
+                await subscriber.queue.join()
+
+    async def commit(self, func):
+        def run():
+            with self.captureOnCommitCallbacks(execute=True):
+                func()
+
+        await sync_to_async(run)()
+        await self.namespace.publish()
+        await self.settle()
+
+    def test_snapshot_then_diffs_by_filter(self):
+        async def scenario():
+            self.namespace.add_subscriber("sid_all", None)
+            self.namespace.add_subscriber("sid_tournament", "tournament")
+            await self.settle()
+
+            def create_tournament():
+                game = Game.objects.create(is_tournament=True, n_players=4)
+                self.tournament = GameRoom.objects.create(
+                    host=self.users[1], game=game, title="tournament"
+                )
+
+            await self.commit(create_tournament)
+
+            def start_dual():
+                self.dual.is_playing = True
+                self.dual.save()
+
+            await self.commit(start_dual)
+            await self.commit(lambda: self.tournament.game.delete())
+            for sid in ("sid_all", "sid_tournament"):
+                self.namespace.remove_subscriber(sid)
+
+        async_to_sync(scenario)()
+
+        events = self.get_events("sid_all")
+        self.assertEqual(
+            [event for event, _ in events],
+            ["lobby_snapshot", "room_added", "room_updated", "room_removed"],
+        )
+        self.assertEqual(events[0][1]["rooms"][0]["room"]["title"], "dual")
+        self.assertTrue(events[2][1]["room"]["room"]["is_playing"])
+        self.assertEqual(events[3][1]["room"]["room_id"], self.tournament.id)
+        versions = [data["version"] for _, data in events]
+        self.assertEqual(versions, sorted(versions))
+
+        events = self.get_events("sid_tournament")
+        self.assertEqual(
+            [event for event, _ in events],
+            ["lobby_snapshot", "room_added", "room_removed"],
+        )
+        self.assertEqual(events[0][1]["rooms"], [])
+
+    def test_slow_subscriber_gets_snapshot(self):
+        async def scenario():
+            subscriber = LobbySubscriber("sid", None, max_queue=2)
+            subscriber.queue.get_nowait()  # initial snapshot sent
+            subscriber.queue.task_done()
+            subscriber.resync = False
+
+            subscriber.push(1, "room_updated", {})
+            subscriber.push(2, "room_updated", {})
+            self.assertFalse(subscriber.resync)
+            subscriber.push(3, "room_updated", {})
+            self.assertTrue(subscriber.resync)
+            self.assertEqual(subscriber.queue.qsize(), 1)
+            self.assertIsNone(subscriber.queue.get_nowait())
+            # dropped until the snapshot is sent
+            subscriber.push(4, "room_updated", {})
+            self.assertTrue(subscriber.queue.empty())
+
+        async_to_sync(scenario)()
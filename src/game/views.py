@@ -16,6 +16,7 @@ from livegame.gameroom_session import (
 )
 from .models import Game, GameRoom, GamePlayer, SubGame
 from .databaseio import get_single_game_room, create_game
+from .lobby import LOBBY_SNAPSHOT
 from .serializers import (
     GameSerializer,
     GameRoomSerializer,
@@ -69,26 +70,20 @@ class GameRoomViewSet(
                         exception='Invalid filter value. Expected "tournament" or "dual"',
                         status_code=status.HTTP_400_BAD_REQUEST,
                     )
-                game_rooms = GameRoom.objects.filter(
-                    game__is_tournament=filter_val == "tournament"
-                ).order_by("id")
-            else:
-                game_rooms = GameRoom.objects.all().order_by("id")
-            context = paginator.paginate_queryset(game_rooms, request)
-            data = []
-            for game_room in context:
-                game_room_serializer = GameRoomSerializer(game_room)
-                game_serializer = GameSerializer(game_room.game)
-                players = game_room.game.game_player.all().order_by("id")
-                players_serializer = GamePlayerSerializer(players, many=True)
-                data.append(
-                    {
-                        "game": game_serializer.data,
-                        "room": game_room_serializer.data,
-                        "players": players_serializer.data,
-                    }
+            # served from the lobby snapshot, see lobby.py
+            version, game_rooms = LOBBY_SNAPSHOT.get(filter_val)
+            etag = LOBBY_SNAPSHOT.get_etag(filter_val, version)
+            if LOBBY_SNAPSHOT.is_not_modified(
+                request.headers.get("If-None-Match", ""), etag
+            ):
+                return Response(
+                    status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
                 )
-            return paginator.get_paginated_response(data)
+            data = paginator.paginate_queryset(game_rooms, request)
+            response = paginator.get_paginated_response(data)
+            response["ETag"] = etag
+            response["Cache-Control"] = "no-cache"
+            return response
         except Exception as e:
             raise CustomError(
                 e, "game_room", status_code=status.HTTP_400_BAD_REQUEST
@@ -1,30 +1,28 @@
+import copy
 import math
 import random
 import logging
-from typing import List, Tuple
+from typing import Iterator, List, Tuple, Union
 from enum import Enum
 
-from pong.settings import LOGLEVEL_TRACE_ENABLE
 from ..subgame_config import SubGameConfig
-from .balltrack_segment import (
-    BallTrackSegment,
-    get_ball_track_segment_to_wall,
-    get_ball_track_segment_to_paddle,
-)
+from ..trace_config import TRACE_ENABLED
+from .balltrack_segment import BallTrackSegment
 
 
 class BallTrack:
+    # shared by all instances since BallTrack is created on every paddle hit
+    logger = logging.getLogger(f"{__package__}.BallTrack")
+
     class Heading(Enum):
         LEFT = 1
         RIGHT = 2
 
         @staticmethod
         def opposite(heading):
-            opposite_map = {
-                BallTrack.Heading.LEFT: BallTrack.Heading.RIGHT,
-                BallTrack.Heading.RIGHT: BallTrack.Heading.LEFT,
-            }
-            return opposite_map[heading]
+            if heading == BallTrack.Heading.LEFT:
+                return BallTrack.Heading.RIGHT
+            return BallTrack.Heading.LEFT
 
     def __init__(
         self,
@@ -38,119 +36,180 @@ class BallTrack:
         if config.flt_eq(dx_start, 0.0):
             raise ValueError("Cannot construct BallTrack because dx is 0.0")
         self.config = config
-        self.logger = logging.getLogger(f"{__package__}.{self.__class__.__name__}")
         self.t_start = t_start
+        self.x_start = x_start
+        self.y_start = y_start
+        self.dx = dx_start
+        self.dy = dy_start
         self.v = math.hypot(dx_start, dy_start)
         self.heading = (
             BallTrack.Heading.LEFT if dx_start < 0 else BallTrack.Heading.RIGHT
         )
-        # below: variables should be calculated with calculate_segments()
-        self.segments: List[BallTrackSegment] = []
+        # below: variables should be calculated with calculate_impact()
+        self.x_impact: float = 0.0
         self.y_impact: float = 0.0
+        self.dy_impact: float = 0.0  # dy of the ball when it reaches paddle side
         self.t_duration: float = 0.0
         self.t_end: float = 0.0
-        self.calculate_segments(x_start, y_start, dx_start, dy_start)
+        self.tile_start: int = 0
+        self.tile_end: int = 0
+        # segments are only built when someone (i.e. serializer) asks for them
+        self._segments: Union[None, List[BallTrackSegment]] = None
+        # set by BallTrackCache, so that cached tracks are serialized only once
+        self.serialized_segments: Union[None, List[dict]] = None
+        self.calculate_impact()
+
+    def trace(self, msg: str, *args) -> None:
+        if TRACE_ENABLED:
+            self.logger.debug("[TRACE] " + msg, *args)
+
+    # Index of the mirrored copy of the field which contains unfolded y.
+    # Instead of reflecting the ball on the walls, the ball keeps flying straight
+    # through copies of the field stacked along y axis (copy k covers
+    # [y_min + k * height, y_min + (k + 1) * height]), odd copies being upside down.
+    # A point lying exactly on a wall belongs to the copy the ball is heading to.
+    def get_tile(self, y_unfolded: float) -> int:
+        pos = (y_unfolded - self.config.y_min) / (self.config.y_max - self.config.y_min)
+        if self.dy >= 0:
+            return math.floor(pos)
+        return math.ceil(pos) - 1
+
+    # Folds unfolded y back into [y_min, y_max]
+    def fold_y(self, y_unfolded: float, tile: int) -> float:
+        height = self.config.y_max - self.config.y_min
+        offset = y_unfolded - (self.config.y_min + tile * height)
+        if tile % 2 == 0:
+            return self.config.y_min + offset
+        return self.config.y_max - offset
+
+    # Calculates where and when the ball gets out of the game, in O(1)
+    # regardless of the number of bounces on the walls
+    def calculate_impact(self) -> None:
+        self.x_impact = self.config.x_max if self.dx > 0 else self.config.x_min
+        # |(dx, dy)| == v, thus the time of flight equals to the length of the
+        # track divided by v
+        self.t_duration = (self.x_impact - self.x_start) / self.dx
+        self.t_end = self.t_start + self.t_duration
+
+        y_unfolded = self.y_start + self.dy * self.t_duration
+        self.tile_start = self.get_tile(self.y_start)
+        self.tile_end = self.get_tile(y_unfolded)
+        self.y_impact = self.fold_y(y_unfolded, self.tile_end)
+        self.dy_impact = self.dy if self.tile_end % 2 == 0 else -self.dy
+        self.trace(
+            "self.y_impact %s n_bounces %s self.t_end %s",
+            self.y_impact,
+            self.n_bounces,
+            self.t_end,
+        )
 
-    def trace(self, msg: str) -> None:
-        if LOGLEVEL_TRACE_ENABLE != "0":
-            self.logger.debug(f"[TRACE] {msg}")
+    @property
+    def n_bounces(self) -> int:
+        return abs(self.tile_end - self.tile_start)
 
-    # Calculates the all ball track segments based on initial (x, y) and (dx, dy)
-    # until the ball gets out of the game
-    def calculate_segments(
-        self, x_start: float, y_start: float, dx: float, dy: float
-    ) -> None:
-        while True:
-            self.trace("calculate_segments loop start")
-            self.trace("call get_ball_track_segment_to_wall")
-            next_track = get_ball_track_segment_to_wall(
-                self.config, x_start, y_start, dx, dy
-            )
-            if next_track.is_valid:
-                self.trace("next track is valid")
-                self.segments.append(next_track)
-                x_start = next_track.x_end
-                y_start = next_track.y_end
-                dx, dy = next_track.next_dx_dy
-                self.trace(f"x_start {x_start} y_start {y_start} dx {dx} dy {dy}")
-                self.trace("continue...")
-                continue
-
-            # ball doesn't hit the wall, thus must hit paddle side
-            next_track = get_ball_track_segment_to_paddle(
-                self.config, x_start, y_start, dx, dy
+    # Points where the ball bounces off the walls, in the order of time
+    @property
+    def bounce_points(self) -> List[Tuple[float, float]]:
+        height = self.config.y_max - self.config.y_min
+        if self.dy > 0:  # wall k is between copy k - 1 and copy k
+            walls = range(self.tile_start + 1, self.tile_end + 1)
+        else:
+            walls = range(self.tile_start, self.tile_end, -1)
+
+        points = []
+        for wall in walls:
+            y_wall = self.config.y_min + wall * height
+            t_wall = (y_wall - self.y_start) / self.dy
+            points.append(
+                (
+                    self.x_start + self.dx * t_wall,
+                    self.config.y_min if wall % 2 == 0 else self.config.y_max,
+                )
             )
-            self.trace("call get_ball_track_segment_to_paddle")
-            if next_track.is_valid:
-                self.trace("next track is valid")
-                self.segments.append(next_track)
-                self.trace("break")
-                break
-
-            # ball doesn't hit walls neither paddles?
-            raise ValueError("Error while calculating ball's movement")
-
-        self.y_impact = self.segments[-1].y_end
-        len_total = sum(seg.len for seg in self.segments)
-        self.t_duration = len_total / self.v  # v * t = d, t = d / v
-        self.t_end = self.t_start + self.t_duration
-        self.trace(
-            f"self.y_impact {self.y_impact} len_total {len_total} self.t_end {self.t_end}"
+        return points
+
+    # Yields segments one by one without keeping them,
+    # for consumers (i.e. serializer) which need each segment only once
+    def iter_segments(self) -> Iterator[BallTrackSegment]:
+        x_start, y_start = self.x_start, self.y_start
+        tile = self.tile_start
+        for x_end, y_end in self.bounce_points:
+            # every bounce flips the sign of dy
+            dy = self.dy if tile % 2 == 0 else -self.dy
+            yield BallTrackSegment(x_start, y_start, x_end, y_end, self.dx, dy)
+            x_start, y_start = x_end, y_end
+            tile += 1
+        dy = self.dy if tile % 2 == 0 else -self.dy
+        yield BallTrackSegment(
+            x_start, y_start, self.x_impact, self.y_impact, self.dx, dy
         )
 
+    @property
+    def segments(self) -> List[BallTrackSegment]:
+        if self._segments is None:
+            self._segments = list(self.iter_segments())
+        return self._segments
+
+    # Same track launched at t_start; solved values and segments are shared
+    def launched_at(self, t_start: float) -> "BallTrack":
+        balltrack = copy.copy(self)
+        balltrack.t_start = t_start
+        balltrack.t_end = t_start + self.t_duration
+        return balltrack
+
     def next_dx_dy(self, paddle_dy: float) -> Tuple[float, float]:
-        new_dx, new_dy = self.segments[-1].next_dx_dy
+        # horizontal reflection on the paddle
+        new_dx, new_dy = -self.dx, self.dy_impact
         new_dy += paddle_dy * self.config.u_paddle
         return new_dx, new_dy
 
     @property
     def next_xy_start(self) -> Tuple[float, float]:
-        return self.segments[-1].next_xy_start
+        return self.x_impact, self.y_impact
 
     def __str__(self) -> str:
-        pts = [f"({seg.x_start}, {seg.y_start})" for seg in self.segments]
-        pts.append(f"({self.segments[-1].x_end}, {self.segments[-1].y_end})")
-        pts_str = " > ".join(pts)
+        pts = [(self.x_start, self.y_start)]
+        pts.extend(self.bounce_points)
+        pts.append((self.x_impact, self.y_impact))
+        pts_str = " > ".join(f"({x}, {y})" for x, y in pts)
         return (
             f"BallTrack {self.heading.name}, "
             f"dt={self.t_duration}, t={self.t_start}...{self.t_end}, v={self.v}, {pts_str}"
         )
 
 
+default_rng = random.Random()
+
+
+# Draws a random launch velocity of speed v whose angle is at least
+# excluded_angle_scope degrees away from both x and y axes.
+# A single uniform draw is mapped onto the allowed angles directly:
+# the first half of the range goes upward, the second half downward.
 def get_random_dx_dy(
-    v: float, excluded_angle_scope: float, heading=None
+    v: float,
+    excluded_angle_scope: float,
+    heading=None,
+    rng: Union[None, random.Random] = None,
 ) -> Tuple[float, float]:
+    if rng is None:
+        rng = default_rng
     if heading is None:
-        heading = random.choice([BallTrack.Heading.LEFT, BallTrack.Heading.RIGHT])
+        heading = rng.choice([BallTrack.Heading.LEFT, BallTrack.Heading.RIGHT])
 
-    # Convert excluded_angle_scope from degrees to radians
     exc = math.radians(excluded_angle_scope)
+    width = math.pi / 2 - 2 * exc  # allowed angles per quadrant
+    if width <= 0:
+        raise ValueError(f"excluded_angle_scope too large: {excluded_angle_scope}")
 
-    # Function to check if an angle is within the excluded scope near the x or y axes
-    def is_excluded(angle):
-        # Check proximity to the x-axis
-        if (angle < exc or angle > math.pi - exc) or (
-            angle > math.pi + exc and angle < 2 * math.pi - exc
-        ):
-            return True
-        # Check proximity to the y-axis
-        if (angle > math.pi / 2 - exc and angle < math.pi / 2 + exc) or (
-            angle > 3 * math.pi / 2 - exc and angle < 3 * math.pi / 2 + exc
-        ):
-            return True
-        return False
-
-    while True:
-        angle = random.uniform(0, 2 * math.pi)
-        if not is_excluded(angle):
-            break
+    draw = rng.uniform(0, 2 * width)
+    if draw < width:
+        angle = exc + draw
+    else:
+        angle = -(exc + draw - width)
 
     dx = v * math.cos(angle)
     dy = v * math.sin(angle)
-
-    if (heading == BallTrack.Heading.LEFT and dx >= 0) or (
-        heading == BallTrack.Heading.RIGHT and dx <= 0
-    ):
+    if heading == BallTrack.Heading.LEFT:
         dx = -dx
 
     return dx, dy
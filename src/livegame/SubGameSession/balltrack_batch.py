@@ -0,0 +1,109 @@
+from typing import List
+
+import numpy as np
+
+from ..subgame_config import SubGameConfig
+
+
+# Vectorized counterpart of BallTrack for N balls sharing one SubGameConfig.
+# Uses the same unfolding as BallTrack: the ball flies straight through mirrored
+# copies of the field, and the result is folded back into [y_min, y_max].
+class BallTrackBatch:
+    def __init__(
+        self,
+        config: SubGameConfig,
+        x_start,
+        y_start,
+        dx_start,
+        dy_start,
+        t_start,
+    ) -> None:
+        self.config = config
+        self.x_start = np.asarray(x_start, dtype=float)
+        self.y_start = np.asarray(y_start, dtype=float)
+        self.dx = np.asarray(dx_start, dtype=float)
+        self.dy = np.asarray(dy_start, dtype=float)
+        self.t_start = np.asarray(t_start, dtype=float)
+        if np.any(np.isclose(self.dx, 0.0, rtol=0.0, atol=config.e)):
+            raise ValueError("Cannot construct BallTrackBatch because dx is 0.0")
+        self.v = np.hypot(self.dx, self.dy)
+        # below: arrays should be calculated with calculate_impact()
+        self.x_impact: np.ndarray
+        self.y_impact: np.ndarray
+        self.dy_impact: np.ndarray
+        self.t_duration: np.ndarray
+        self.t_end: np.ndarray
+        self.tile_start: np.ndarray
+        self.tile_end: np.ndarray
+        self.calculate_impact()
+
+    def __len__(self) -> int:
+        return len(self.x_start)
+
+    @property
+    def height(self) -> float:
+        return self.config.y_max - self.config.y_min
+
+    # see BallTrack.get_tile()
+    def get_tile(self, y_unfolded: np.ndarray) -> np.ndarray:
+        pos = (y_unfolded - self.config.y_min) / self.height
+        return np.where(self.dy >= 0, np.floor(pos), np.ceil(pos) - 1).astype(int)
+
+    # see BallTrack.fold_y()
+    def fold_y(self, y_unfolded: np.ndarray, tile: np.ndarray) -> np.ndarray:
+        offset = y_unfolded - (self.config.y_min + tile * self.height)
+        return np.where(
+            tile % 2 == 0, self.config.y_min + offset, self.config.y_max - offset
+        )
+
+    def calculate_impact(self) -> None:
+        self.x_impact = np.where(self.dx > 0, self.config.x_max, self.config.x_min)
+        self.t_duration = (self.x_impact - self.x_start) / self.dx
+        self.t_end = self.t_start + self.t_duration
+
+        y_unfolded = self.y_start + self.dy * self.t_duration
+        self.tile_start = self.get_tile(self.y_start)
+        self.tile_end = self.get_tile(y_unfolded)
+        self.y_impact = self.fold_y(y_unfolded, self.tile_end)
+        self.dy_impact = np.where(self.tile_end % 2 == 0, self.dy, -self.dy)
+
+    @property
+    def n_bounces(self) -> np.ndarray:
+        return np.abs(self.tile_end - self.tile_start)
+
+    # Bounce points of every ball as a list of (n_bounces[i], 2) arrays,
+    # computed for all balls at once and split afterwards
+    @property
+    def bounce_points(self) -> List[np.ndarray]:
+        n_bounces = self.n_bounces
+        n_total = int(n_bounces.sum())
+        idx_ball = np.repeat(np.arange(len(self)), n_bounces)
+        # k-th bounce of each ball
+        idx_bounce = np.arange(n_total) - np.repeat(
+            np.cumsum(n_bounces) - n_bounces, n_bounces
+        )
+
+        # wall k is between copy k - 1 and copy k, see BallTrack.bounce_points
+        going_up = self.dy[idx_ball] > 0
+        wall_first = np.where(
+            going_up, self.tile_start[idx_ball] + 1, self.tile_start[idx_ball]
+        )
+        wall = wall_first + np.where(going_up, idx_bounce, -idx_bounce)
+
+        y_wall = self.config.y_min + wall * self.height
+        t_wall = (y_wall - self.y_start[idx_ball]) / self.dy[idx_ball]
+        points = np.empty((n_total, 2))
+        points[:, 0] = self.x_start[idx_ball] + self.dx[idx_ball] * t_wall
+        points[:, 1] = np.where(wall % 2 == 0, self.config.y_min, self.config.y_max)
+        return np.split(points, np.cumsum(n_bounces)[:-1])
+
+    def next_dx_dy(self, paddle_dy) -> np.ndarray:
+        new_dx = -self.dx
+        new_dy = (
+            self.dy_impact + np.asarray(paddle_dy, dtype=float) * self.config.u_paddle
+        )
+        return np.stack((new_dx, new_dy), axis=-1)
+
+    @property
+    def next_xy_start(self) -> np.ndarray:
+        return np.stack((self.x_impact, self.y_impact), axis=-1)
@@ -3,9 +3,9 @@ from dataclasses import dataclass
 from enum import Enum
 from typing import Dict, Union
 
-from pong.settings import LOGLEVEL_TRACE_ENABLE
 from ..precision_config import round_time, round_coord, round_speed
 from ..subgame_config import SubGameConfig
+from ..trace_config import TRACE_ENABLED
 
 
 class Player(Enum):
@@ -54,33 +54,33 @@ class Paddle:
         self.last_key_input: Union[None, KeyInput] = None
         self.ack_status = PaddleAckStatus.CREATED
 
-    def trace(self, msg: str) -> None:
-        if LOGLEVEL_TRACE_ENABLE != "0":
-            self.logger.debug(f"[TRACE] {msg}")
+    def trace(self, msg: str, *args) -> None:
+        if TRACE_ENABLED:
+            self.logger.debug("[TRACE] " + msg, *args)
 
     def update(self, time_now: float) -> None:
         time_elapsed = time_now - self.t_last_updated
-        self.trace(f"{time_elapsed} seconds passed")
+        self.trace("%s seconds passed", time_elapsed)
 
         new_y = self.y + self.dy * time_elapsed
-        self.trace(f"new_y: {new_y}")
+        self.trace("new_y: %s", new_y)
         if new_y > self.y_max:
             new_y = self.y_max
-            self.trace(f"new_y clipped to max {new_y}")
+            self.trace("new_y clipped to max %s", new_y)
         if new_y < self.y_min:
             new_y = self.y_min
-            self.trace(f"new_y clipped to min {new_y}")
+            self.trace("new_y clipped to min %s", new_y)
         self.y = new_y
 
         self.t_last_updated = time_now
-        self.trace(f"t_last_updated {self.t_last_updated}")
+        self.trace("t_last_updated %s", self.t_last_updated)
 
     def update_key(self, key_input: KeyInput, time_now: float) -> bool:
         if self.last_key_input == key_input:
-            self.trace(f"ignore key input same with last input: {key_input}")
+            self.trace("ignore key input same with last input: %s", key_input)
             return False
 
-        self.trace(f"update_key {key_input}")
+        self.trace("update_key %s", key_input)
         self.last_key_input = key_input
         self.update(time_now)
 
@@ -113,7 +113,7 @@ class Paddle:
         else:
             raise ValueError(f"Invalid KeyInput Action: {key_input}")
 
-        self.trace(f"self.dy {self.dy}")
+        self.trace("self.dy %s", self.dy)
         return True
 
     def hit(self, y_ball: float) -> bool:
@@ -122,7 +122,7 @@ class Paddle:
             <= y_ball
             <= self.y + self.config.l_paddle / 2
         )
-        self.trace(f"y_ball {y_ball} => hit: {result}")
+        self.trace("y_ball %s => hit: %s", y_ball, result)
         return result
 
     def to_dict(self) -> dict:
@@ -5,23 +5,51 @@ from ..precision_config import round_coord, round_speed, round_time
 
 
 def serialize_balltracksegment(seg: BallTrackSegment):
+    x_start, y_start, x_end, y_end, dx, dy = seg
     return {
-        "x_s": round_coord(seg.x_start),
-        "y_s": round_coord(seg.y_start),
-        "x_e": round_coord(seg.x_end),
-        "y_e": round_coord(seg.y_end),
-        "dx": round_speed(seg.dx),
-        "dy": round_speed(seg.dy),
+        "x_s": round_coord(x_start),
+        "y_s": round_coord(y_start),
+        "x_e": round_coord(x_end),
+        "y_e": round_coord(y_end),
+        "dx": round_speed(dx),
+        "dy": round_speed(dy),
     }
 
 
+def serialize_balltrack_segments(balltrack: BallTrack):
+    return [serialize_balltracksegment(seg) for seg in balltrack.iter_segments()]
+
+
 def serialize_balltrack(balltrack: BallTrack):
+    segments = balltrack.serialized_segments
+    if segments is None:
+        segments = serialize_balltrack_segments(balltrack)
+    return {
+        "t_event": round_time(balltrack.t_start),
+        "t_end": round_time(balltrack.t_end),
+        "heading": balltrack.heading.name,
+        "velocity": round_speed(balltrack.v),
+        "segments": segments,
+    }
+
+
+# Delta form of serialize_balltrack() for clients connected with `track=delta`.
+# Segments are not sent: the ball starts at (x_s, y_s) with (dx, dy), bounces
+# off y_min / y_max alternately at bounce_x (first wall is the one dy heads to,
+# dy flips on every bounce), and reaches x_min / x_max (by heading) at y_e.
+# Full form is sent again on @resync_track_ball.
+def serialize_balltrack_delta(balltrack: BallTrack):
     return {
         "t_event": round_time(balltrack.t_start),
         "t_end": round_time(balltrack.t_end),
         "heading": balltrack.heading.name,
         "velocity": round_speed(balltrack.v),
-        "segments": [serialize_balltracksegment(seg) for seg in balltrack.segments],
+        "x_s": round_coord(balltrack.x_start),
+        "y_s": round_coord(balltrack.y_start),
+        "dx": round_speed(balltrack.dx),
+        "dy": round_speed(balltrack.dy),
+        "bounce_x": [round_coord(x) for x, _ in balltrack.bounce_points],
+        "y_e": round_coord(balltrack.y_impact),
     }
 
 
@@ -1,16 +1,19 @@
+import math
 import time
+import random
+import asyncio
 import logging
-from typing import Dict
+from typing import Dict, Union
 from enum import Enum
-import asyncio
-import socketio
 
-from pong import settings
-from pong.settings import LOGLEVEL_TRACE_ENABLE
-from accounts.models import User
-from socketcontrol.events import sio, get_user_by_token
+from socketcontrol.events import sio
 from ..precision_config import get_time, round_time
 from ..subgame_config import SubGameConfig
+from ..trace_config import TRACE_ENABLED
+from ..scheduler import SCHEDULER, TimerHandle
+from ..time_left_broadcaster import TIME_LEFT_BROADCASTER
+from ..client_options import ClientOptions
+from ..livegame_namespace import LIVEGAME_NAMESPACE
 from .paddle import (
     Paddle,
     KeyInput,
@@ -18,7 +21,9 @@ from .paddle import (
     PaddleAckStatus,
 )
 from .balltrack import BallTrack, get_random_dx_dy
-from .sio_adapter import serialize_balltrack
+from .balltrack_cache import get_balltrack
+from .wire_format import pack_balltrack, pack_paddle
+from .sio_adapter import serialize_balltrack, serialize_balltrack_delta
 
 
 class TurnResult(Enum):
@@ -27,7 +32,7 @@ class TurnResult(Enum):
     B_SCORED = 2
 
 
-class SubGameSession(socketio.AsyncNamespace):
+class SubGameSession:
     def __init__(
         self,
         config: SubGameConfig,
@@ -36,8 +41,12 @@ class SubGameSession(socketio.AsyncNamespace):
         intra_id_b: str,
         idx_rank: int,
         idx_in_rank: int,
+        seed: Union[None, int] = None,
     ):
-        super().__init__(f"{gameroom_session.namespace}/{idx_rank}/{idx_in_rank}")
+        # every subgame lives in the shared /livegame namespace, in its own room
+        self.namespace = LIVEGAME_NAMESPACE.namespace
+        self.subgame_id = f"{gameroom_session.game_room_id}/{idx_rank}/{idx_in_rank}"
+        self.room = f"subgame/{self.subgame_id}"
 
         self.logger = logging.getLogger(
             f"{__package__}.{self.__class__.__name__}.{idx_rank}.{idx_in_rank}"
@@ -65,45 +74,65 @@ class SubGameSession(socketio.AsyncNamespace):
         self.time_over = False
         self.winner = Player.NOBODY
         self.sid_to_player = {}
-        self.logger.info(f"Created SubGameSession with {self.config}")
+        self.sid_to_options: Dict[str, ClientOptions] = {}
+        self.timer_time_limit: Union[None, TimerHandle] = None
+        self.ended: Union[None, asyncio.Task] = None
+        # every serve is drawn from this rng, thus same seed replays same serves
+        self.seed = self.get_seed() if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.logger.info(f"Created SubGameSession with {self.config}, seed {self.seed}")
         self.logger.debug(f"A: {intra_id_a}, B: {intra_id_b}")
 
-    def trace(self, msg: str) -> None:
-        if LOGLEVEL_TRACE_ENABLE != "0":
-            self.logger.debug(f"[TRACE] {msg}")
-
-    # SIO: F>B connect
-    async def on_connect(self, sid, environ):
-        self.logger.debug(f"connect from sid {sid}")
-        try:
-            cookies = environ.get("HTTP_COOKIE", "")
-            cookie_dict = dict(
-                item.split("=") for item in cookies.split("; ") if "=" in item
-            )
-            token = cookie_dict.get(settings.SIMPLE_JWT["AUTH_COOKIE"], None)
-            if not token:
-                self.logger.warning("No token")
-                await self.disconnect(sid)
-
-            user: User = await get_user_by_token(token)
-
-            if user.intra_id == self.intra_id_a:
-                self.sid_to_player[sid] = Player.A
-            elif user.intra_id == self.intra_id_b:
-                self.sid_to_player[sid] = Player.B
-            else:
-                self.logger.warning(f"connected {user.intra_id} is not assigned player")
-                await self.disconnect(sid)
+    # Seed derived from config.rng_seed (e.g. for load tests) and the position in
+    # the tournament, or a random one if config.rng_seed is not given
+    def get_seed(self) -> int:
+        if self.config.rng_seed is None:
+            return random.SystemRandom().getrandbits(32)
+        return random.Random(
+            f"{self.config.rng_seed}/{self.idx_rank}/{self.idx_in_rank}"
+        ).getrandbits(32)
+
+    def trace(self, msg: str, *args) -> None:
+        if TRACE_ENABLED:
+            self.logger.debug("[TRACE] " + msg, *args)
+
+    # called by LiveGameNamespace for every connected sid of the given user
+    async def join(self, sid: str, intra_id: str, options: ClientOptions) -> bool:
+        if intra_id == self.intra_id_a:
+            player = Player.A
+        elif intra_id == self.intra_id_b:
+            player = Player.B
+        else:
+            self.logger.warning(f"{intra_id} is not assigned player")
+            return False
 
-        except Exception as e:
-            self.logger.error(f"Error in connect: {e}")
-            await self.disconnect(sid)
+        self.logger.debug(f"join from sid {sid} as player {player.name}")
+        self.sid_to_player[sid] = player
+        self.sid_to_options[sid] = options
+        await sio.enter_room(sid, self.room, namespace=self.namespace)
 
-    # SIO: F>B disconnect
-    def on_disconnect(self, sid):
-        self.logger.debug(f"disconnect from sid {sid}")
-        if sid in self.sid_to_player:
-            del self.sid_to_player[sid]
+        event = "enter_subgame"
+        data = {
+            "t_event": get_time(),
+            "idx_rank": self.idx_rank,
+            "idx_in_rank": self.idx_in_rank,
+            "player": player.name,
+        }
+        # SIO: B>F enter_subgame
+        await sio.emit(event, data=data, to=sid, namespace=self.namespace)
+        return True
+
+    # called by LiveGameNamespace on disconnect, room is left by socket.io
+    def leave(self, sid: str) -> None:
+        self.logger.debug(f"leave from sid {sid}")
+        self.sid_to_player.pop(sid, None)
+        self.sid_to_options.pop(sid, None)
+
+    # called by LiveGameNamespace once the rank is over
+    async def close(self) -> None:
+        await sio.close_room(self.room, namespace=self.namespace)
+        self.sid_to_player.clear()
+        self.sid_to_options.clear()
 
     # SIO: F>B keyboard_input
     async def on_keyboard_input(self, sid, data):
@@ -155,6 +184,29 @@ class SubGameSession(socketio.AsyncNamespace):
         player: Player = self.sid_to_player[sid]
         self.paddles[player].ack_status = PaddleAckStatus.STARTED
 
+    # SIO: F>B resync_track_ball
+    # client lost track of delta updates, answer with the full current track
+    async def on_resync_track_ball(self, sid, data):
+        self.logger.debug(f"resync_track_ball from sid {sid}, data={data}")
+
+        if not self.running:
+            self.logger.debug("SubGameSession is not running")
+            return
+
+        if not sid in self.sid_to_player:
+            self.logger.warning(f"sid {sid} is not connected player")
+            return
+
+        if not hasattr(self, "balltrack"):  # ball is not served yet
+            return
+
+        if self.sid_to_options[sid].binary:
+            data = pack_balltrack(self.balltrack)
+        else:
+            data = serialize_balltrack(self.balltrack)
+        # SIO: B>F update_track_ball
+        await sio.emit("update_track_ball", data=data, to=sid, namespace=self.namespace)
+
     async def ensure_start(self) -> None:
         self.running = True
 
@@ -162,7 +214,7 @@ class SubGameSession(socketio.AsyncNamespace):
             self.t_start = time.time() + self.config.t_delay_subgame_start
             self.t_end = self.t_start + self.config.t_limit
             await self.emit_start()
-            await asyncio.sleep(self.config.t_delay_subgame_start)
+            await SCHEDULER.sleep(self.config.t_delay_subgame_start)
 
             if all(
                 paddle.ack_status == PaddleAckStatus.STARTED
@@ -187,11 +239,14 @@ class SubGameSession(socketio.AsyncNamespace):
     async def start(self) -> None:
         await self.ensure_start()
 
-        asyncio.create_task(self.emit_update_time_left_until_end())
-        asyncio.create_task(self.ensure_time_limit())
+        await self.emit_update_time_left(int(self.config.t_limit), get_time())
+        TIME_LEFT_BROADCASTER.register(self)
+        self.timer_time_limit = SCHEDULER.call_at(
+            self.t_start + self.config.t_limit, self.ensure_time_limit
+        )
 
-        new_x, new_y = get_random_dx_dy(self.config.v_ball, 20)
-        self.balltrack = BallTrack(
+        new_x, new_y = get_random_dx_dy(self.config.v_ball, 20, rng=self.rng)
+        self.balltrack = get_balltrack(
             self.config,
             self.config.x_ball_init,
             self.config.y_ball_init,
@@ -199,19 +254,20 @@ class SubGameSession(socketio.AsyncNamespace):
             new_y,
             self.t_start,
         )
-        self.logger.debug(f"start balltrack: {self.balltrack}")
+        self.logger.debug("start balltrack: %s", self.balltrack)
 
-        # run until score reaches matchpoint
+        # run until score reaches matchpoint (or time limit ends it)
         while self.running:
             # emit balltrack
             await self.emit_update_track_ball()
             # assign offense/defense players/paddles
             result = await self.wait_ball_travel()
+            if result is None:  # ended by the time limit during the turn
+                break
             self.determine_winner()
 
             if self.winner != Player.NOBODY:  # winner determined
-                await self.ensure_ended()
-                return
+                break
 
             # winner not determined
 
@@ -221,9 +277,13 @@ class SubGameSession(socketio.AsyncNamespace):
                 new_x_start, new_y_start = self.balltrack.next_xy_start
                 new_dx, new_dy = self.balltrack.next_dx_dy(self.paddle_defense.dy)
                 self.trace(
-                    f"new x, y: {new_x_start}, {new_y_start}, dx, dy: {new_dx}, {new_dy}"
+                    "new x, y: %s, %s, dx, dy: %s, %s",
+                    new_x_start,
+                    new_y_start,
+                    new_dx,
+                    new_dy,
                 )
-                self.balltrack = BallTrack(
+                self.balltrack = get_balltrack(
                     self.config,
                     new_x_start,
                     new_y_start,
@@ -238,10 +298,12 @@ class SubGameSession(socketio.AsyncNamespace):
                 f"Scoring happened({result.name}), "
                 f"sleeping {self.config.t_delay_scoring} seconds"
             )
-            await asyncio.sleep(self.config.t_delay_scoring)
+            await SCHEDULER.sleep(self.config.t_delay_scoring)
             new_heading = BallTrack.Heading.opposite(self.balltrack.heading)
-            new_dx, new_dy = get_random_dx_dy(self.config.v_ball, 20, new_heading)
-            self.balltrack = BallTrack(
+            new_dx, new_dy = get_random_dx_dy(
+                self.config.v_ball, 20, new_heading, rng=self.rng
+            )
+            self.balltrack = get_balltrack(
                 self.config,
                 self.config.x_ball_init,
                 self.config.y_ball_init,
@@ -250,6 +312,8 @@ class SubGameSession(socketio.AsyncNamespace):
                 time.time(),
             )
 
+        await self.end()
+
     # SIO: F>B ended_ack
     async def on_ended_ack(self, sid, data):
         self.logger.debug(f"ended_ack from sid {sid}, data={data}")
@@ -261,8 +325,24 @@ class SubGameSession(socketio.AsyncNamespace):
         player: Player = self.sid_to_player[sid]
         self.paddles[player].ack_status = PaddleAckStatus.ENDED
 
+    def cancel_timers(self) -> None:
+        TIME_LEFT_BROADCASTER.unregister(self)
+        if self.timer_time_limit is not None:
+            self.timer_time_limit.cancel()
+        self.timer_time_limit = None
+
+    # Ends the subgame once, whoever comes first (start loop or time limit):
+    # later calls get the same task, thus the result is saved only once
+    def end(self) -> asyncio.Task:
+        if self.ended is None:
+            self.running = False
+            self.cancel_timers()
+            self.t_end = time.time()
+            self.ended = asyncio.get_running_loop().create_task(self.ensure_ended())
+        return self.ended
+
     async def ensure_ended(self) -> None:
-        self.running = False
+        await self.gr_session.save_subgame_result(self)
 
         for _ in range(self.config.max_retry_network):
             self.t_end = time.time()
@@ -270,7 +350,7 @@ class SubGameSession(socketio.AsyncNamespace):
             await self.gr_session.report_winner_of_subgame(
                 self.idx_rank, self.idx_in_rank, self.winner
             )
-            await asyncio.sleep(self.config.t_delay_retry_network)
+            await SCHEDULER.sleep(self.config.t_delay_retry_network)
 
             if all(
                 paddle.ack_status == PaddleAckStatus.ENDED
@@ -288,15 +368,16 @@ class SubGameSession(socketio.AsyncNamespace):
             f"culprit: {', '.join(timeout_culprit)}"
         )
 
+    # called by SCHEDULER at t_start + t_limit
     async def ensure_time_limit(self) -> None:
-        await asyncio.sleep(self.t_start + self.config.t_limit - time.time())
+        self.timer_time_limit = None
         self.time_over = True
         self.determine_winner()
 
         if self.winner == Player.NOBODY:  # enter sudden death mode
             await self.emit_time_up()
-        else:  # winner determined
-            await self.ensure_ended()
+        else:  # winner determined, start() waits for the end
+            self.end()
 
     def update_turns(self) -> None:
         if self.balltrack.heading == BallTrack.Heading.LEFT:
@@ -310,11 +391,14 @@ class SubGameSession(socketio.AsyncNamespace):
             f"Attack: {self.paddle_offense.player.name} -> {self.paddle_defense.player.name}"
         )
 
-    async def wait_ball_travel(self) -> TurnResult:
+    # None if the subgame ended while the ball was traveling
+    async def wait_ball_travel(self) -> Union[None, TurnResult]:
         self.update_turns()
 
         # await until ball hits the other side
-        await asyncio.sleep(self.balltrack.t_end - time.time())
+        await SCHEDULER.sleep_until(self.balltrack.t_end)
+        if not self.running:
+            return None
         new_t = time.time()
 
         # only update defending paddle
@@ -342,35 +426,40 @@ class SubGameSession(socketio.AsyncNamespace):
         event = "start"
         data = {"t_event": round_time(self.t_start)}
         # SIO: B>F start
-        await sio.emit(event, data=data, namespace=self.namespace)
-        self.logger.debug(
-            f"Emit event {event} data {data} to namespace {self.namespace}"
-        )
+        await sio.emit(event, data=data, room=self.room, namespace=self.namespace)
+        self.logger.debug("Emit event %s data %s to room %s", event, data, self.room)
+
+    # seconds left until time limit, rounded up; None once not running
+    def get_time_left(self, now: float) -> Union[None, int]:
+        if not self.running:
+            return None
+        return max(0, math.ceil(self.t_start + self.config.t_limit - now))
 
-    async def emit_update_time_left(self, time_left: int) -> None:
+    # called every second by TIME_LEFT_BROADCASTER
+    async def emit_update_time_left(self, time_left: int, t_event: float) -> None:
         if not self.running:
             return
 
+        skip_sids = [
+            sid
+            for sid, options in self.sid_to_options.items()
+            if options.time_left_by_client
+        ]
+        if skip_sids and len(skip_sids) >= len(self.sid_to_player):
+            return  # every client counts down by itself
+
         event = "update_time_left"
-        data = {"t_event": get_time(), "time_left": time_left}
+        data = {"t_event": t_event, "time_left": time_left}
         # SIO: B>F update_time_left
-        await sio.emit(event, data=data, namespace=self.namespace)
-        self.logger.debug(
-            f"Emit event {event} data {data} to namespace {self.namespace}"
+        await sio.emit(
+            event,
+            data=data,
+            room=self.room,
+            skip_sid=skip_sids or None,
+            namespace=self.namespace,
         )
         return
 
-    async def emit_update_time_left_until_end(self) -> None:
-        for time_elapsed in range(int(self.config.t_limit) + 1):
-            if not self.running:
-                return
-
-            time_left = int(self.config.t_limit) - time_elapsed
-            await self.emit_update_time_left(time_left)
-
-            next_emit_t = self.t_start + time_elapsed + 1
-            await asyncio.sleep(next_emit_t - time.time())
-
     async def emit_update_scores(self) -> None:
         if not self.running:
             return
@@ -385,52 +474,83 @@ class SubGameSession(socketio.AsyncNamespace):
             "score_b": self.paddles[Player.B].score,
         }
         # SIO: B>F update_scores
-        await sio.emit(event, data=data, namespace=self.namespace)
-        self.logger.debug(
-            f"Emit event {event} data {data} to namespace {self.namespace}"
-        )
+        await sio.emit(event, data=data, room=self.room, namespace=self.namespace)
+        self.logger.debug("Emit event %s data %s to room %s", event, data, self.room)
 
     async def emit_update_track_ball(self):
         if not self.running:
             return
 
-        event = "update_track_ball"
-        data = serialize_balltrack(self.balltrack)
         # SIO: B>F update_track_ball
-        await sio.emit(event, data=data, namespace=self.namespace)
-        self.logger.debug(
-            f"Emit event {event} data {data} to namespace {self.namespace}"
+        await self.emit_track(
+            "update_track_ball",
+            self.balltrack,
+            serialize_balltrack,
+            pack_balltrack,
+            serialize_balltrack_delta,
         )
 
     async def emit_update_track_paddle(self, paddle: Paddle):
         if not self.running:
             return
 
-        event = "update_track_paddle"
-        data = paddle.to_dict()
         # SIO: B>F update_track_paddle
-        await sio.emit(event, data=data, namespace=self.namespace)
-        self.logger.debug(
-            f"Emit event {event} data {data} to namespace {self.namespace}"
+        await self.emit_track(
+            "update_track_paddle", paddle, Paddle.to_dict, pack_paddle
         )
 
+    # Emits obj to each client in the form it negotiated on connect:
+    # packed bytes (`encoding=binary`), delta (`track=delta`) or JSON dict
+    async def emit_track(
+        self, event: str, obj, serialize, pack, serialize_delta=None
+    ) -> None:
+        sids_by_encoder: Dict[object, list] = {}
+        for sid, options in self.sid_to_options.items():
+            if options.binary:
+                encoder = pack
+            elif options.track_delta and serialize_delta is not None:
+                encoder = serialize_delta
+            else:
+                continue
+            sids_by_encoder.setdefault(encoder, []).append(sid)
+
+        skip_sids = [sid for sids in sids_by_encoder.values() for sid in sids]
+        if len(skip_sids) < len(self.sid_to_player):
+            data = serialize(obj)
+            await sio.emit(
+                event,
+                data=data,
+                room=self.room,
+                skip_sid=skip_sids or None,
+                namespace=self.namespace,
+            )
+            self.logger.debug(
+                "Emit event %s data %s to room %s", event, data, self.room
+            )
+        for encoder, sids in sids_by_encoder.items():
+            data = encoder(obj)
+            await sio.emit(event, data=data, to=sids, namespace=self.namespace)
+            self.logger.debug(
+                "Emit event %s via %s to %s clients", event, encoder.__name__, len(sids)
+            )
+
     async def emit_time_up(self):
         event = "time_up"
         data = {"t_event": round_time(self.t_end)}
         # SIO: B>F time_up
-        await sio.emit(event, data=data, namespace=self.namespace)
-        self.logger.debug(
-            f"Emit event {event} data {data} to namespace {self.namespace}"
-        )
+        await sio.emit(event, data=data, room=self.room, namespace=self.namespace)
+        self.logger.debug("Emit event %s data %s to room %s", event, data, self.room)
 
     async def emit_ended(self):
         event = "ended"
-        data = {"t_event": round_time(self.t_end), "winner": self.winner.name}
+        data = {
+            "t_event": round_time(self.t_end),
+            "winner": self.winner.name,
+            "seed": self.seed,
+        }
         # SIO: B>F ended
-        await sio.emit(event, data=data, namespace=self.namespace)
-        self.logger.debug(
-            f"Emit event {event} data {data} to namespace {self.namespace}"
-        )
+        await sio.emit(event, data=data, room=self.room, namespace=self.namespace)
+        self.logger.debug("Emit event %s data %s to room %s", event, data, self.room)
 
     def __str__(self) -> str:
         return f"SubGameSession[{self.idx_rank}][{self.idx_in_rank}] t_start={self.t_start}"
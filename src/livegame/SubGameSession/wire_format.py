@@ -0,0 +1,59 @@
+import struct
+
+from ..SubGameSession.balltrack import BallTrack
+from ..SubGameSession.paddle import Paddle
+
+# Compact binary layout of update_track_ball / update_track_paddle for clients
+# connected with `encoding=binary`. All little-endian, sent as one socket.io
+# binary attachment (ArrayBuffer on the client).
+#
+# update_track_ball:
+#   t_event f64 | t_end f64 | heading u8 (1: LEFT, 2: RIGHT) | velocity f32
+#   | n_segments u16 | n_segments * (x_s, y_s, x_e, y_e, dx, dy) f32
+# update_track_paddle:
+#   t_event f64 | player u8 (1: A, 2: B) | y f32 | dy f32
+BALLTRACK_HEADER = struct.Struct("<ddBfH")
+BALLTRACK_SEGMENT = struct.Struct("<6f")
+PADDLE = struct.Struct("<dBff")
+
+
+def pack_balltrack(balltrack: BallTrack) -> bytes:
+    segments = balltrack.segments
+    buf = bytearray(BALLTRACK_HEADER.size + BALLTRACK_SEGMENT.size * len(segments))
+    BALLTRACK_HEADER.pack_into(
+        buf,
+        0,
+        balltrack.t_start,
+        balltrack.t_end,
+        balltrack.heading.value,
+        balltrack.v,
+        len(segments),
+    )
+    offset = BALLTRACK_HEADER.size
+    for seg in segments:
+        BALLTRACK_SEGMENT.pack_into(buf, offset, *seg)
+        offset += BALLTRACK_SEGMENT.size
+    return bytes(buf)
+
+
+def unpack_balltrack(data: bytes) -> dict:
+    t_event, t_end, heading, velocity, n_segments = BALLTRACK_HEADER.unpack_from(
+        data, 0
+    )
+    segments = [
+        dict(zip(("x_s", "y_s", "x_e", "y_e", "dx", "dy"), values))
+        for values in BALLTRACK_SEGMENT.iter_unpack(
+            data[BALLTRACK_HEADER.size :][: BALLTRACK_SEGMENT.size * n_segments]
+        )
+    ]
+    return {
+        "t_event": t_event,
+        "t_end": t_end,
+        "heading": BallTrack.Heading(heading).name,
+        "velocity": velocity,
+        "segments": segments,
+    }
+
+
+def pack_paddle(paddle: Paddle) -> bytes:
+    return PADDLE.pack(paddle.t_last_updated, paddle.player.value, paddle.y, paddle.dy)
@@ -0,0 +1,26 @@
+from dataclasses import dataclass
+from urllib.parse import parse_qs
+
+
+# Per-connection options sent by the client in the socket.io connect query
+# string, e.g. io("/subgame/...", { query: { time_left: "client" } })
+@dataclass
+class ClientOptions:
+    # client derives the countdown from t_start (@start) and time_limit (config)
+    # by itself, thus does not need @update_time_left every second
+    time_left_by_client: bool = False
+    # update_track_ball / update_track_paddle as struct-packed bytes,
+    # see SubGameSession/wire_format.py
+    binary: bool = False
+    # update_track_ball as start state + bounce x's (ignored with binary),
+    # see serialize_balltrack_delta()
+    track_delta: bool = False
+
+
+def parse_client_options(environ: dict) -> ClientOptions:
+    query = parse_qs(environ.get("QUERY_STRING", ""))
+    return ClientOptions(
+        time_left_by_client=query.get("time_left", [""])[-1] == "client",
+        binary=query.get("encoding", [""])[-1] == "binary",
+        track_delta=query.get("track", [""])[-1] == "delta",
+    )
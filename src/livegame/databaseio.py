@@ -1,16 +1,19 @@
 import time
 import logging
+from dataclasses import dataclass
+from typing import Dict, List, Set, Tuple
 
-from asgiref.sync import sync_to_async
-from django.db.models import Prefetch
-from game.models import GamePlayer, GameRoom
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from game.models import Game, GamePlayer, GameRoom, SubGame
 from game.serializers import GamePlayerSerializer, GameSerializer, GameRoomSerializer
-
+from game.lobby import invalidate_game_on_commit
+from .db_executor import db_sync_to_async
 
 logger = logging.getLogger(f"{__package__}.{__name__}")
 
 
-@sync_to_async
+@db_sync_to_async
 def left_game_room(game_room_id, intra_id):
     try:
         game_room = GameRoom.objects.prefetch_related(
@@ -48,7 +51,7 @@ def left_game_room(game_room_id, intra_id):
     return data, player_id_list, sid_list, am_i_host_list
 
 
-@sync_to_async
+@db_sync_to_async
 def get_room_data(game_room_id):
     try:
         game_room = GameRoom.objects.prefetch_related(
@@ -95,3 +98,115 @@ def serialize_game_data(game, game_room, players):
         "room": game_room_serializer.data,
         "players": players_serializer.data,
     }
+
+
+# One finished subgame, as written to SubGame
+@dataclass
+class SubGameRow:
+    rank: int
+    idx_in_rank: int
+    intra_id_a: str
+    intra_id_b: str
+    point_a: int
+    point_b: int
+    winner: str  # "A" or "B"
+    t_start: float
+    t_end: float
+
+
+# Rank of each player after the given subgames: losers keep the rank they
+# lost in, winners get the next one (the champion ends up with -1)
+def get_player_ranks(rows: List[SubGameRow]) -> Dict[str, int]:
+    ranks: Dict[str, int] = {}
+    for row in rows:
+        if row.winner == "A":
+            rank_a, rank_b = row.rank - 1, row.rank
+        else:
+            rank_a, rank_b = row.rank, row.rank - 1
+        for intra_id, rank in ((row.intra_id_a, rank_a), (row.intra_id_b, rank_b)):
+            ranks[intra_id] = min(rank, ranks.get(intra_id, rank))
+    return ranks
+
+
+# Writes finished subgames of any number of games in one transaction, with a
+# constant number of queries regardless of the number of subgames.
+# Subgames of a game arrive in the order they ended, thus ranks written by a
+# later batch always replace earlier ones correctly.
+# Ranks stay provisional until the game ends: the game only gets its users
+# (i.e. shows up in history and stats) in finish_game.
+# Games deleted in the meantime (destroyed rooms) are skipped without failing
+# the others; returns their ids.
+def write_subgame_rows(batch: List[Tuple[Game, SubGameRow]]) -> Set[int]:
+    games: Dict[int, Game] = {}
+    rows_by_game: Dict[int, List[SubGameRow]] = {}
+    for game, row in batch:
+        games[game.pk] = game
+        rows_by_game.setdefault(game.pk, []).append(row)
+    ranks_by_game = {
+        game_id: get_player_ranks(rows) for game_id, rows in rows_by_game.items()
+    }
+
+    with transaction.atomic():
+        query = Q()
+        for game_id, ranks in ranks_by_game.items():
+            query |= Q(game_id=game_id, user__in=ranks.keys())
+        players = {
+            (player.game_id, player.user_id): player
+            for player in GamePlayer.objects.filter(query)
+        }
+        skipped = {
+            game_id
+            for game_id, ranks in ranks_by_game.items()
+            if any((game_id, intra_id) not in players for intra_id in ranks)
+        }
+        for game_id in skipped:
+            logger.warning(f"game {game_id} no longer exists, its subgames skipped")
+            del ranks_by_game[game_id]
+
+        SubGame.objects.bulk_create(
+            [
+                SubGame(
+                    game=game,
+                    rank=row.rank,
+                    idx_in_rank=row.idx_in_rank,
+                    player_a=players[(game.pk, row.intra_id_a)],
+                    player_b=players[(game.pk, row.intra_id_b)],
+                    point_a=row.point_a,
+                    point_b=row.point_b,
+                    winner=row.winner,
+                    t_start=row.t_start,
+                    t_end=row.t_end,
+                )
+                for game, row in batch
+                if game.pk not in skipped
+            ]
+        )
+
+        players = {
+            key: player for key, player in players.items() if key[0] not in skipped
+        }
+        for (game_id, intra_id), player in players.items():
+            player.rank = ranks_by_game[game_id][intra_id]
+        GamePlayer.objects.bulk_update(players.values(), ["rank"])
+        # bulk_update sends no post_save: the lobby lists ranks of rooms in play
+        for game_id in ranks_by_game:
+            invalidate_game_on_commit(game_id)
+
+    logger.debug(f"saved subgames of {len(games) - len(skipped)} games")
+    return skipped
+
+
+# The game is over: its players get it in user.games, the room goes away
+@db_sync_to_async
+def finish_game(game: Game, game_room_id: int) -> None:
+    with transaction.atomic():
+        Game.users.through.objects.bulk_create(
+            [
+                Game.users.through(game_id=game.pk, user_id=intra_id)
+                for intra_id in GamePlayer.objects.filter(game=game).values_list(
+                    "user_id", flat=True
+                )
+            ],
+            ignore_conflicts=True,
+        )
+        GameRoom.objects.filter(pk=game_room_id).delete()
@@ -0,0 +1,139 @@
+import os
+import time
+import asyncio
+import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Union
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+logger = logging.getLogger(f"{__package__}.{__name__}")
+
+
+# Dedicated pool of DB worker threads for the socket layer.
+# With the default thread-sensitive sync_to_async, every DB call of every room
+# is serialized on the single thread shared with the rest of the ASGI app;
+# here they run on up to `max_workers` threads of their own, each keeping its
+# own connection (reused according to CONN_MAX_AGE).
+# At most `max_pending` calls are submitted at once: callers beyond that wait
+# on the event loop instead of piling up in the pool's unbounded queue.
+# `max_workers=0` falls back to the default sync_to_async thread.
+class DBExecutor:
+    def __init__(self, max_workers: int, max_pending: int) -> None:
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers, 1)
+        self.executor: Union[None, ThreadPoolExecutor] = None
+        self.semaphore: Union[None, asyncio.Semaphore] = None
+        self.loop: Union[None, asyncio.AbstractEventLoop] = None
+        self.lock = threading.Lock()
+        self.n_waiting = 0  # waiting for a pending slot, on the event loop
+        self.n_queued = 0  # submitted, waiting for a worker thread
+        self.n_running = 0
+        self.n_calls = 0
+        self.n_errors = 0
+        self.max_queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def get_executor(self) -> Union[None, ThreadPoolExecutor]:
+        if self.max_workers <= 0:
+            return None
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="livegame-db"
+            )
+        return self.executor
+
+    def get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.semaphore = asyncio.Semaphore(self.max_pending)
+        return self.semaphore
+
+    async def run(self, func: Callable, *args, **kwargs):
+        t_submit = time.monotonic()
+        self.n_waiting += 1
+        try:
+            await self.get_semaphore().acquire()
+        finally:
+            self.n_waiting -= 1
+
+        semaphore = self.semaphore
+        try:
+            with self.lock:
+                self.n_queued += 1
+                self.max_queued = max(self.max_queued, self.n_queued)
+            executor = self.get_executor()
+            call = functools.partial(
+                self.call, executor is not None, t_submit, func, *args, **kwargs
+            )
+            if executor is None:
+                return await sync_to_async(call)()
+            return await sync_to_async(
+                call, thread_sensitive=False, executor=executor
+            )()
+        finally:
+            semaphore.release()
+
+    # runs in the worker thread
+    def call(self, in_pool: bool, t_submit: float, func: Callable, *args, **kwargs):
+        wait = time.monotonic() - t_submit
+        with self.lock:
+            self.n_queued -= 1
+            self.n_running += 1
+            self.n_calls += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+        # like request_started / request_finished of a request
+        if in_pool:
+            close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            with self.lock:
+                self.n_errors += 1
+            raise
+        finally:
+            if in_pool:
+                close_old_connections()
+            with self.lock:
+                self.n_running -= 1
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def to_dict(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "waiting": self.n_waiting,
+            "queued": self.n_queued,
+            "running": self.n_running,
+            "calls": self.n_calls,
+            "errors": self.n_errors,
+            "max_queued": self.max_queued,
+            "avg_wait": self.total_wait / self.n_calls if self.n_calls else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+
+DB_EXECUTOR = DBExecutor(
+    max_workers=int(os.environ.get("LIVEGAME_DB_WORKERS", "4")),
+    max_pending=int(os.environ.get("LIVEGAME_DB_MAX_PENDING", "64")),
+)
+
+
+# drop-in replacement of @sync_to_async for DB helpers of the socket layer
+def db_sync_to_async(func: Callable) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await DB_EXECUTOR.run(func, *args, **kwargs)
+
+    return wrapper
@@ -6,19 +6,20 @@ from typing import Dict, List
 from enum import Enum
 
 import socketio
-from asgiref.sync import sync_to_async
-from pong import settings
-from accounts.models import User, UserDataCache, fetch_user_data_cache
-from game.models import Game, GamePlayer, GameRoom, SubGame
+from accounts.models import User, UserDataCache, get_user_data_cache
+from game.models import Game, GamePlayer, GameRoom
 from socketcontrol.events import sio
-from socketcontrol.events import get_user_by_token
+from socketcontrol.auth import get_user_from_environ
 from .precision_config import get_time
 from .SubGameSession.subgame_session import SubGameSession
+from .livegame_namespace import LIVEGAME_NAMESPACE
 from .SubGameSession.paddle import Player
 from .subgame_result import SubGameResult
 from .subgame_config import get_default_subgame_config
 from .SubGameSession.sio_adapter import serialize_subgame_config
-from .databaseio import left_game_room, get_room_data
+from .databaseio import left_game_room, get_room_data, finish_game, SubGameRow
+from .result_writer import SUBGAME_RESULT_WRITER
+from .db_executor import DB_EXECUTOR, db_sync_to_async
 
 
 def is_power_of_two(n: int) -> bool:
@@ -32,7 +33,7 @@ def is_power_of_two(n: int) -> bool:
     return n > 1 and (n & (n - 1)) == 0
 
 
-@sync_to_async
+@db_sync_to_async
 def update_game_room_sid(user, sid):
     user.socket_session.game_room_session_id = sid
     user.socket_session.save()
@@ -82,20 +83,16 @@ class GameRoomSession(socketio.AsyncNamespace):
     async def on_connect(self, sid, environ):
         self.logger.debug(f"connect from sid {sid}")
         try:
-            cookies = environ.get("HTTP_COOKIE", "")
-            cookie_dict = dict(
-                item.split("=") for item in cookies.split("; ") if "=" in item
-            )
-            token = cookie_dict.get(settings.SIMPLE_JWT["AUTH_COOKIE"], None)
-
-            if not token:
-                self.logger.warning("No token")
+            user: User = await get_user_from_environ(environ)
+            if not user:
                 await self.disconnect(sid)
+                return
 
-            user: User = await get_user_by_token(token)
             await update_game_room_sid(user, sid)
 
-            self.sid_to_user_data[sid] = await fetch_user_data_cache(user)
+            self.sid_to_user_data[sid] = await DB_EXECUTOR.run(
+                get_user_data_cache, user
+            )
 
             self.logger.debug(f"sid_to_user_data: {self.sid_to_user_data}")
         except Exception as e:
@@ -190,36 +187,41 @@ class GameRoomSession(socketio.AsyncNamespace):
                     idx_rank=self.rank_ongoing,
                     idx_in_rank=idx_in_rank,
                 )
-                sio.register_namespace(subgame_result.session)
+                await LIVEGAME_NAMESPACE.register_subgame(subgame_result.session)
 
-            self.logger.debug(f"sleeping {self.config.t_delay_rank_start} seconds...")
-            await asyncio.sleep(self.config.t_delay_rank_start)
+            try:
+                self.logger.debug(
+                    f"sleeping {self.config.t_delay_rank_start} seconds..."
+                )
+                await asyncio.sleep(self.config.t_delay_rank_start)
 
-            self.logger.debug(
-                f"wait until all SubGameSession ends in rank {self.rank_ongoing}"
-            )
-            session_results = await asyncio.gather(
-                *[  # update winner & emit update tournament happens inside subgameresult
-                    self.start_subgame(subgameresult.session)
-                    for subgameresult in self.tournament_tree[self.rank_ongoing]
-                ]
-            )
+                self.logger.debug(
+                    f"wait until all SubGameSession ends in rank {self.rank_ongoing}"
+                )
+                session_results = await asyncio.gather(
+                    *[  # update winner & emit update tournament happens inside subgameresult
+                        self.start_subgame(subgameresult.session)
+                        for subgameresult in self.tournament_tree[self.rank_ongoing]
+                    ]
+                )
 
-            if any(result != SubGameSessionResult.OK for result in session_results):
-                self.logger.warning("GameRoomSession terminate")
-                await self.emit_destroyed(get_cause_of_termination(session_results))
-                await sync_to_async(self.game.delete)()
-                return
+                if any(result != SubGameSessionResult.OK for result in session_results):
+                    self.logger.warning("GameRoomSession terminate")
+                    await self.emit_destroyed(get_cause_of_termination(session_results))
+                    await DB_EXECUTOR.run(self.game.delete)
+                    return
 
-            self.logger.debug(f"sleeping {self.config.t_delay_rank_end} seconds...")
-            await asyncio.sleep(self.config.t_delay_rank_end)
+                self.logger.debug(f"sleeping {self.config.t_delay_rank_end} seconds...")
+                await asyncio.sleep(self.config.t_delay_rank_end)
 
-            for subgame_result in self.tournament_tree[self.rank_ongoing]:
-                # 시작 - 종료 시간 반영
-                subgame_result.t_start = subgame_result.session.t_start
-                subgame_result.t_end = subgame_result.session.t_end
-                # 이번 rank의 SubGameResult들 un-register
-                sio.namespace_handlers.pop(subgame_result.session.namespace)
+                for subgame_result in self.tournament_tree[self.rank_ongoing]:
+                    # 시작 - 종료 시간 반영
+                    subgame_result.t_start = subgame_result.session.t_start
+                    subgame_result.t_end = subgame_result.session.t_end
+            finally:
+                # 이번 rank의 SubGameResult들 un-register, destroyed or not
+                for subgame_result in self.tournament_tree[self.rank_ongoing]:
+                    await LIVEGAME_NAMESPACE.unregister_subgame(subgame_result.session)
 
             self.update_tournament_tree(self.rank_ongoing, self.rank_ongoing - 1)
 
@@ -234,48 +236,26 @@ class GameRoomSession(socketio.AsyncNamespace):
 
         self.logger.info("GameRoom finished.")
 
-    @sync_to_async
-    def update_database(self):
-        # game_room delete
-        GameRoom.objects.get(pk=self.game_room_id).delete()
-        # save subgame result
-        for rank in self.tournament_tree:
-            for subgame_result in rank:
-                player_a_intra_id = self.sid_to_user_data[subgame_result.sid_a].intra_id
-                player_b_intra_id = self.sid_to_user_data[subgame_result.sid_b].intra_id
-                player_a = GamePlayer.objects.get(
-                    user__intra_id=player_a_intra_id, game=self.game
-                )
-                player_b = GamePlayer.objects.get(
-                    user__intra_id=player_b_intra_id, game=self.game
-                )
-                SubGame.objects.create(
-                    game=self.game,
-                    rank=subgame_result.session.idx_rank,
-                    idx_in_rank=subgame_result.session.idx_in_rank,
-                    player_a=player_a,
-                    player_b=player_b,
-                    point_a=subgame_result.session.paddles[Player.A].score,
-                    point_b=subgame_result.session.paddles[Player.B].score,
-                    winner=subgame_result.winner,
-                    t_start=subgame_result.t_start,
-                    t_end=subgame_result.t_end,
-                )
-                if subgame_result.winner == "A":
-                    player_a.rank = subgame_result.session.idx_rank - 1
-                    player_b.rank = subgame_result.session.idx_rank
-                else:
-                    player_a.rank = subgame_result.session.idx_rank
-                    player_b.rank = subgame_result.session.idx_rank - 1
-                self.logger.debug(
-                    f"subgame rank {subgame_result.session.idx_rank}, "
-                    f"winner: {subgame_result.winner}, "
-                    f"player_a: {player_a.rank}, player_b: {player_b.rank}"
-                )
-                player_a.save()
-                player_b.save()
-                self.game.users.add(player_a.user)
-                self.game.users.add(player_b.user)
+    # SubGameSession: queued to the write-behind pipeline as soon as it ends
+    async def save_subgame_result(self, session: SubGameSession) -> None:
+        row = SubGameRow(
+            rank=session.idx_rank,
+            idx_in_rank=session.idx_in_rank,
+            intra_id_a=session.intra_id_a,
+            intra_id_b=session.intra_id_b,
+            point_a=session.paddles[Player.A].score,
+            point_b=session.paddles[Player.B].score,
+            winner=session.winner.name,
+            t_start=session.t_start,
+            t_end=session.t_end,
+        )
+        await SUBGAME_RESULT_WRITER.put(self.game, row)
+
+    # subgames are already queued one by one, only the rest is left
+    async def update_database(self):
+        if not await SUBGAME_RESULT_WRITER.flush(self.game):
+            self.logger.error(f"some subgames of {self.game} could not be saved")
+        await finish_game(self.game, self.game_room_id)
 
     def get_sid_from_intra_id(self, intra_id) -> str:
         for sid_key, user_data in self.sid_to_user_data.items():
@@ -290,7 +270,7 @@ class GameRoomSession(socketio.AsyncNamespace):
         host_intra = self.sid_to_user_data[sid].intra_id
         return host_intra == self.host_user.intra_id
 
-    @sync_to_async
+    @db_sync_to_async
     def build_tournament_tree(self):
         game_room = GameRoom.objects.get(pk=self.game_room_id)
         game = game_room.game
@@ -412,7 +392,7 @@ class GameRoomSession(socketio.AsyncNamespace):
             f"Emit event {event} data {data} to namespace {self.namespace}"
         )
 
-    @sync_to_async
+    @db_sync_to_async
     def game_start(self):
         game_room = self.game.game_room
         game_room.is_playing = True
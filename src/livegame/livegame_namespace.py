@@ -0,0 +1,117 @@
+import logging
+from typing import Dict, Set
+
+import socketio
+
+from accounts.models import User
+from socketcontrol.auth import get_user_from_environ
+from .client_options import ClientOptions, parse_client_options
+
+
+# Single persistent namespace for every running subgame.
+# Clients connect once (authenticated once) and stay connected across ranks;
+# each SubGameSession is an in-memory object with its own socket.io room,
+# and F>B events are routed to it by the sender's sid.
+class LiveGameNamespace(socketio.AsyncNamespace):
+    def __init__(self) -> None:
+        super().__init__(namespace="/livegame")
+        self.logger = logging.getLogger(f"{__package__}.{__class__.__name__}")
+
+        self.sid_to_intra_id: Dict[str, str] = {}
+        self.sid_to_options: Dict[str, ClientOptions] = {}
+        self.intra_id_to_sids: Dict[str, Set[str]] = {}
+        # subgame id ("<game_room_id>/<idx_rank>/<idx_in_rank>") -> SubGameSession
+        self.subgames: Dict[str, object] = {}
+        self.intra_id_to_subgame: Dict[str, object] = {}
+        self.sid_to_subgame: Dict[str, object] = {}
+
+    # SIO: F>B connect
+    async def on_connect(self, sid, environ):
+        self.logger.debug(f"connect from sid {sid}")
+        user: User = await get_user_from_environ(environ)
+        if not user:
+            return False
+
+        await self.add_client(sid, user.intra_id, parse_client_options(environ))
+        return True
+
+    async def add_client(self, sid: str, intra_id: str, options: ClientOptions):
+        self.sid_to_intra_id[sid] = intra_id
+        self.sid_to_options[sid] = options
+        self.intra_id_to_sids.setdefault(intra_id, set()).add(sid)
+
+        # (re)connected while own subgame is already registered
+        subgame = self.intra_id_to_subgame.get(intra_id, None)
+        if subgame is not None:
+            await self.join_subgame(sid, subgame)
+
+    # SIO: F>B disconnect
+    async def on_disconnect(self, sid):
+        self.logger.debug(f"disconnect from sid {sid}")
+        intra_id = self.sid_to_intra_id.pop(sid, None)
+        self.sid_to_options.pop(sid, None)
+        if intra_id is not None:
+            sids = self.intra_id_to_sids.get(intra_id, set())
+            sids.discard(sid)
+            if not sids:
+                self.intra_id_to_sids.pop(intra_id, None)
+
+        subgame = self.sid_to_subgame.pop(sid, None)
+        if subgame is not None:
+            subgame.leave(sid)
+
+    async def join_subgame(self, sid: str, subgame) -> None:
+        if await subgame.join(sid, self.sid_to_intra_id[sid], self.sid_to_options[sid]):
+            self.sid_to_subgame[sid] = subgame
+
+    async def register_subgame(self, subgame) -> None:
+        self.subgames[subgame.subgame_id] = subgame
+        for intra_id in (subgame.intra_id_a, subgame.intra_id_b):
+            self.intra_id_to_subgame[intra_id] = subgame
+            for sid in list(self.intra_id_to_sids.get(intra_id, ())):
+                await self.join_subgame(sid, subgame)
+        self.logger.debug(f"registered subgame {subgame.subgame_id}")
+
+    async def unregister_subgame(self, subgame) -> None:
+        self.subgames.pop(subgame.subgame_id, None)
+        for intra_id in (subgame.intra_id_a, subgame.intra_id_b):
+            if self.intra_id_to_subgame.get(intra_id, None) is subgame:
+                del self.intra_id_to_subgame[intra_id]
+        for sid in list(subgame.sid_to_player):
+            if self.sid_to_subgame.get(sid, None) is subgame:
+                del self.sid_to_subgame[sid]
+        await subgame.close()
+        self.logger.debug(f"unregistered subgame {subgame.subgame_id}")
+
+    def get_subgame(self, sid: str, event: str):
+        subgame = self.sid_to_subgame.get(sid, None)
+        if subgame is None:
+            self.logger.warning(f"{event} from sid {sid} which is not in any subgame")
+        return subgame
+
+    # SIO: F>B keyboard_input
+    async def on_keyboard_input(self, sid, data):
+        subgame = self.get_subgame(sid, "keyboard_input")
+        if subgame is not None:
+            await subgame.on_keyboard_input(sid, data)
+
+    # SIO: F>B start_ack
+    async def on_start_ack(self, sid, data):
+        subgame = self.get_subgame(sid, "start_ack")
+        if subgame is not None:
+            await subgame.on_start_ack(sid, data)
+
+    # SIO: F>B ended_ack
+    async def on_ended_ack(self, sid, data):
+        subgame = self.get_subgame(sid, "ended_ack")
+        if subgame is not None:
+            await subgame.on_ended_ack(sid, data)
+
+    # SIO: F>B resync_track_ball
+    async def on_resync_track_ball(self, sid, data):
+        subgame = self.get_subgame(sid, "resync_track_ball")
+        if subgame is not None:
+            await subgame.on_resync_track_ball(sid, data)
+
+
+LIVEGAME_NAMESPACE = LiveGameNamespace()
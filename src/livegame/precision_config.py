@@ -5,6 +5,7 @@ import os
 prc_time = int(os.environ.get("PRECISION_TIME", "3"))
 prc_coord = int(os.environ.get("PRECISION_COORD", "1"))
 prc_speed = int(os.environ.get("PRECISION_SPEED", "2"))
+prc_angle = int(os.environ.get("PRECISION_ANGLE", "1"))  # in degrees
 
 
 def get_time() -> float:
@@ -27,3 +28,9 @@ def round_speed(val: float) -> float:
     if not isinstance(val, float):
         return val
     return round(val, prc_speed)
+
+
+def round_angle(val: float) -> float:
+    if not isinstance(val, float):
+        return val
+    return round(val, prc_angle)
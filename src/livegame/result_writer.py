@@ -0,0 +1,143 @@
+import os
+import asyncio
+import logging
+from typing import Dict, List, Set, Tuple, Union
+
+from game.models import Game
+from .databaseio import SubGameRow, write_subgame_rows
+from .db_executor import DB_EXECUTOR
+
+
+# Write-behind pipeline of finished subgames.
+# Results are queued as soon as each subgame ends; a single worker task takes
+# whatever has queued up (up to `batch_size`) and writes it in one transaction,
+# so that concurrent subgames of all rooms share DB round trips.
+# If that transaction fails, the batch is written again game by game, so that
+# one broken game does not take the results of the other rooms with it.
+# The queue is bounded: when the DB falls behind, put() waits (backpressure).
+class SubGameResultWriter:
+    logger = logging.getLogger(f"{__package__}.SubGameResultWriter")
+
+    def __init__(self, max_size: int, batch_size: int) -> None:
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.queue: Union[None, asyncio.Queue] = None
+        self.task: Union[None, asyncio.Task] = None
+        # game_id -> number of its rows queued or being written
+        self.pending: Dict[int, int] = {}
+        # game_id -> flush() calls waiting for its rows, and whether all were saved
+        self.waiters: Dict[int, List[asyncio.Future]] = {}
+        self.failed_games: Set[int] = set()
+        self.n_written = 0
+        self.n_batches = 0
+        self.n_skipped = 0
+        self.n_failed = 0
+
+    def ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.task is not None and not self.task.done():
+            if self.task.get_loop() is loop:
+                return
+        self.queue = asyncio.Queue(maxsize=self.max_size)
+        self.task = loop.create_task(self.run())
+
+    async def put(self, game: Game, row: SubGameRow) -> None:
+        self.ensure_running()
+        self.pending[game.pk] = self.pending.get(game.pk, 0) + 1
+        await self.queue.put((game, row))
+
+    # Waits until the rows of the game queued so far are written, regardless of
+    # the other rooms; returns False if some of them could not be saved
+    async def flush(self, game: Game) -> bool:
+        if self.pending.get(game.pk, 0) > 0:
+            future = asyncio.get_running_loop().create_future()
+            self.waiters.setdefault(game.pk, []).append(future)
+            return await future
+        return self.pop_result(game.pk)
+
+    def pop_result(self, game_id: int) -> bool:
+        ok = game_id not in self.failed_games
+        self.failed_games.discard(game_id)
+        return ok
+
+    async def run(self) -> None:
+        while True:
+            batch: List[Tuple[Game, SubGameRow]] = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            try:
+                failed = await self.write(batch)
+            except Exception as e:  # never stop the worker
+                self.logger.error(f"Error while writing {len(batch)} subgames: {e}")
+                failed = {game.pk for game, _ in batch}
+            for game, _ in batch:
+                self.queue.task_done()
+                self.done(game.pk, game.pk not in failed)
+
+    # returns the ids of the games whose rows could not be saved
+    # (rows of games deleted in the meantime are only counted as skipped)
+    async def write(self, batch: List[Tuple[Game, SubGameRow]]) -> Set[int]:
+        self.n_batches += 1
+        try:
+            skipped = await DB_EXECUTOR.run(write_subgame_rows, batch)
+            return self.count(batch, skipped, set())
+        except Exception as e:
+            self.logger.warning(
+                f"batch of {len(batch)} subgames failed ({e}), retry by game"
+            )
+
+        rows_by_game: Dict[int, List[Tuple[Game, SubGameRow]]] = {}
+        for game, row in batch:
+            rows_by_game.setdefault(game.pk, []).append((game, row))
+        skipped: Set[int] = set()
+        failed: Set[int] = set()
+        for game_id, rows in rows_by_game.items():
+            try:
+                skipped |= await DB_EXECUTOR.run(write_subgame_rows, rows)
+            except Exception as e:
+                self.logger.error(
+                    f"Error while writing subgames of game {game_id}: {e}"
+                )
+                failed.add(game_id)
+        return self.count(batch, skipped, failed)
+
+    def count(self, batch, skipped: Set[int], failed: Set[int]) -> Set[int]:
+        for game, _ in batch:
+            if game.pk in failed:
+                self.n_failed += 1
+            elif game.pk in skipped:
+                self.n_skipped += 1
+            else:
+                self.n_written += 1
+        return failed
+
+    def done(self, game_id: int, ok: bool) -> None:
+        if not ok:
+            self.failed_games.add(game_id)
+        self.pending[game_id] -= 1
+        if self.pending[game_id] > 0:
+            return
+        del self.pending[game_id]
+        waiters = self.waiters.pop(game_id, [])
+        if waiters:
+            ok = self.pop_result(game_id)
+            for future in waiters:
+                if not future.done():
+                    future.set_result(ok)
+
+    def to_dict(self) -> dict:
+        return {
+            "queued": 0 if self.queue is None else self.queue.qsize(),
+            "pending_games": len(self.pending),
+            "written": self.n_written,
+            "batches": self.n_batches,
+            "skipped": self.n_skipped,
+            "failed": self.n_failed,
+        }
+
+
+SUBGAME_RESULT_WRITER = SubGameResultWriter(
+    max_size=int(os.environ.get("SUBGAME_RESULT_QUEUE_SIZE", "256")),
+    batch_size=int(os.environ.get("SUBGAME_RESULT_BATCH_SIZE", "64")),
+)
@@ -0,0 +1,143 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from typing import Callable, List, Set, Tuple, Union
+
+logger = logging.getLogger(f"{__package__}.{__name__}")
+
+
+class TimerHandle:
+    __slots__ = ("when", "callback", "args", "cancelled")
+
+    def __init__(self, when: float, callback: Callable, args: tuple) -> None:
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.callback = None
+        self.args = ()
+        self.cancelled = True
+
+
+# Process-wide timer shared by all SubGameSessions.
+# Deadlines (unix time, same as time.time()) are kept in one heap and a single
+# task sleeps until the earliest one, then fires every callback due within
+# `resolution` seconds in one batch. Callbacks may be plain functions or
+# coroutine functions; coroutines are run as tasks owned by the scheduler.
+# A failing callback is logged and never stops the timer of the others.
+class EventScheduler:
+    def __init__(self, resolution: float = 0.001) -> None:
+        self.resolution = resolution
+        self.heap: List[Tuple[float, int, TimerHandle]] = []
+        self.counter = itertools.count()
+        self.task: Union[None, asyncio.Task] = None
+        self.wakeup: Union[None, asyncio.Event] = None
+        self.tasks: Set[asyncio.Task] = set()
+        self.n_wakeups = 0
+        self.n_fired = 0
+
+    def call_at(self, when: float, callback: Callable, *args) -> TimerHandle:
+        handle = TimerHandle(when, callback, args)
+        heapq.heappush(self.heap, (when, next(self.counter), handle))
+        self.ensure_running()
+        if self.heap[0][2] is handle:  # new earliest deadline
+            self.wakeup.set()
+        return handle
+
+    def call_later(self, delay: float, callback: Callable, *args) -> TimerHandle:
+        return self.call_at(time.time() + delay, callback, *args)
+
+    async def sleep_until(self, when: float) -> None:
+        future = asyncio.get_running_loop().create_future()
+        handle = self.call_at(when, set_future_done, future)
+        try:
+            await future
+        finally:
+            handle.cancel()
+
+    async def sleep(self, delay: float) -> None:
+        await self.sleep_until(time.time() + delay)
+
+    def ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.task is not None and not self.task.done():
+            if self.task.get_loop() is loop:
+                return
+        self.wakeup = asyncio.Event()
+        self.task = loop.create_task(self.run())
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                # every sleep_until of every session waits on this task
+                logger.error(f"Error in scheduler loop: {e}")
+                await asyncio.sleep(self.resolution)
+
+    async def run_once(self) -> None:
+        while self.heap and self.heap[0][2].cancelled:
+            heapq.heappop(self.heap)
+
+        self.wakeup.clear()
+        if not self.heap:
+            await self.wakeup.wait()
+            return
+
+        delay = self.heap[0][0] - time.time()
+        if delay > self.resolution:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            return
+
+        self.fire_due()
+
+    def fire_due(self) -> None:
+        self.n_wakeups += 1
+        deadline = time.time() + self.resolution
+        due: List[TimerHandle] = []
+        while self.heap and self.heap[0][0] <= deadline:
+            _, _, handle = heapq.heappop(self.heap)
+            if not handle.cancelled:
+                due.append(handle)
+
+        for handle in due:
+            if handle.cancelled:  # cancelled by a callback fired earlier
+                continue
+            self.n_fired += 1
+            try:
+                result = handle.callback(*handle.args)
+                if asyncio.iscoroutine(result):
+                    task = asyncio.get_running_loop().create_task(result)
+                    self.tasks.add(task)
+                    task.add_done_callback(self.on_task_done)
+            except Exception as e:
+                logger.error(f"Error in scheduled callback {handle.callback}: {e}")
+
+    def on_task_done(self, task: asyncio.Task) -> None:
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error in scheduled task {task}: {task.exception()}")
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def __str__(self) -> str:
+        return (
+            f"EventScheduler pending={len(self.heap)} tasks={len(self.tasks)} "
+            f"wakeups={self.n_wakeups} fired={self.n_fired}"
+        )
+
+
+def set_future_done(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+SCHEDULER = EventScheduler()
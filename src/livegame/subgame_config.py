@@ -1,6 +1,7 @@
 import math
 import os
 import logging
+from typing import Union
 
 from game.models import Game
 
@@ -33,6 +34,7 @@ class SubGameConfig:
         delay_time_after_rank_end: float,
         network_max_retries: int,
         network_delay_between_retries: float,
+        rng_seed: Union[None, int] = None,  # base seed of serves, random if None
     ) -> None:
         self.width = width
         self.height = height
@@ -60,6 +62,7 @@ class SubGameConfig:
         self.t_delay_rank_end = delay_time_after_rank_end
         self.max_retry_network = network_max_retries
         self.t_delay_retry_network = network_delay_between_retries
+        self.rng_seed = rng_seed
 
         for key, value in self.__dict__.items():
             logger.info(f"SubGameConfig {key}: {value}")
@@ -102,6 +105,7 @@ sgc_network_max_retries = os.environ.get("SUBGAMECONFIG_NETWORK_MAX_RETRIES", "5
 sgc_network_delay_between_retries = os.environ.get(
     "SUBGAMECONFIG_NETWORK_DELAY_BETWEEN_RETRIES", "3"
 )
+sgc_rng_seed = os.environ.get("SUBGAMECONFIG_RNG_SEED", "")
 
 
 def get_default_subgame_config(game: Game) -> SubGameConfig:
@@ -128,4 +132,5 @@ def get_default_subgame_config(game: Game) -> SubGameConfig:
         delay_time_after_rank_end=float(sgc_delay_time_after_rank_end),
         network_max_retries=int(sgc_network_max_retries),
         network_delay_between_retries=float(sgc_network_delay_between_retries),
+        rng_seed=int(sgc_rng_seed) if sgc_rng_seed else None,
     )
@@ -1,3 +1,682 @@
-from django.test import TestCase  # pylint: disable=unused-import
+import math
+import time
+import random
+import asyncio
+import threading
+from unittest import IsolatedAsyncioTestCase, mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import SimpleTestCase, TestCase
+
+from accounts.models import User, Profile
+from game.models import Game, GamePlayer, GameRoom, SubGame
+from game.lobby import LOBBY_SNAPSHOT
+
+from .scheduler import EventScheduler
+from .client_options import ClientOptions, parse_client_options
+from .livegame_namespace import LiveGameNamespace
+from .time_left_broadcaster import TimeLeftBroadcaster
+from .subgame_config import SubGameConfig
+from .databaseio import SubGameRow, finish_game, write_subgame_rows
+from .result_writer import SUBGAME_RESULT_WRITER, SubGameResultWriter
+from .gameroom_session import GameRoomSession
+from .db_executor import DB_EXECUTOR, DBExecutor
+from .SubGameSession.balltrack import BallTrack, get_random_dx_dy
+from .SubGameSession.balltrack_batch import BallTrackBatch
+from .SubGameSession.balltrack_cache import BallTrackCache
+from .SubGameSession.paddle import Player, PaddleAckStatus
+from .SubGameSession.subgame_session import SubGameSession
+from .SubGameSession.balltrack_segment import BallTrackSegment
+from .SubGameSession.sio_adapter import (
+    serialize_balltrack,
+    serialize_balltrack_delta,
+    serialize_balltracksegment,
+)
+from .SubGameSession.wire_format import pack_balltrack, unpack_balltrack
+
+
+def get_test_subgame_config() -> SubGameConfig:
+    return SubGameConfig(
+        width=800,
+        height=600,
+        match_point=5,
+        player_a_init_point=0,
+        player_b_init_point=0,
+        paddle_len=50,
+        paddle_len_margin=5,
+        paddle_speed=100,
+        paddle_init_y=0,
+        paddle_friction_coef=0.1,
+        epsilon=1,
+        network_max_deviation=10,
+        ball_init_x=0,
+        ball_init_y=0,
+        ball_speed=200,
+        time_limit=180,
+        delay_time_before_rank_start=5,
+        delay_time_before_subgame_start=3,
+        delay_time_after_scoring=3,
+        delay_time_after_rank_end=5,
+        network_max_retries=5,
+        network_delay_between_retries=3,
+    )
+
+
+class BallTrackTestCase(SimpleTestCase):
+    def setUp(self):
+        self.config = get_test_subgame_config()
+
+    def assert_points_equal(self, actual, expected):
+        self.assertEqual(len(actual), len(expected))
+        for (x_a, y_a), (x_e, y_e) in zip(actual, expected):
+            self.assertAlmostEqual(x_a, x_e)
+            self.assertAlmostEqual(y_a, y_e)
+
+    def test_without_bounce(self):
+        balltrack = BallTrack(self.config, 0.0, 0.0, 200.0, 100.0, 10.0)
+
+        self.assertEqual(balltrack.heading, BallTrack.Heading.RIGHT)
+        self.assertAlmostEqual(balltrack.y_impact, 200.0)
+        self.assertAlmostEqual(balltrack.t_end, 12.0)
+        self.assertEqual(balltrack.bounce_points, [])
+        self.assertEqual(len(balltrack.segments), 1)
+
+    def test_multiple_bounces(self):
+        balltrack = BallTrack(self.config, 0.0, 0.0, 150.0, 500.0, 0.0)
+
+        self.assertEqual(balltrack.n_bounces, 2)
+        self.assert_points_equal(
+            balltrack.bounce_points, [(90.0, 300.0), (270.0, -300.0)]
+        )
+        self.assertAlmostEqual(balltrack.y_impact, 400.0 / 3)
+        self.assertAlmostEqual(balltrack.t_end, 800.0 / 300)
+        self.assertEqual(
+            [segment.dy for segment in balltrack.segments], [500.0, -500.0, 500.0]
+        )
+
+    def test_length_matches_duration(self):
+        balltrack = BallTrack(self.config, 400.0, -120.0, -37.0, -1234.0, 0.0)
+
+        self.assertEqual(balltrack.heading, BallTrack.Heading.LEFT)
+        self.assertEqual(len(balltrack.segments), balltrack.n_bounces + 1)
+        len_total = sum(segment.len for segment in balltrack.segments)
+        self.assertAlmostEqual(len_total / balltrack.v, balltrack.t_duration)
+        self.assertAlmostEqual(balltrack.segments[-1].x_end, self.config.x_min)
+        self.assertAlmostEqual(balltrack.segments[-1].y_end, balltrack.y_impact)
+
+    def test_start_on_wall(self):
+        balltrack = BallTrack(self.config, -400.0, 300.0, 100.0, 100.0, 0.0)
+
+        # ball starting on the top wall heading up is reflected right away
+        self.assertEqual(balltrack.n_bounces, 1)
+        self.assert_points_equal(balltrack.bounce_points, [(200.0, -300.0)])
+        self.assertAlmostEqual(balltrack.y_impact, -100.0)
+
+    def test_next_dx_dy(self):
+        balltrack = BallTrack(self.config, 0.0, 0.0, 150.0, 500.0, 0.0)
+
+        self.assertEqual(balltrack.next_xy_start, (400.0, balltrack.y_impact))
+        new_dx, new_dy = balltrack.next_dx_dy(100.0)
+        self.assertAlmostEqual(new_dx, -150.0)
+        self.assertAlmostEqual(new_dy, 510.0)
+
+
+# the serializer unpacks segments by position: the field order is wire format
+class BallTrackSegmentTestCase(SimpleTestCase):
+    def setUp(self):
+        self.segment = BallTrackSegment(1.0, 2.0, 4.0, 6.0, 30.0, 40.0)
+
+    def test_fields(self):
+        self.assertEqual(
+            BallTrackSegment._fields,
+            ("x_start", "y_start", "x_end", "y_end", "dx", "dy"),
+        )
+        self.assertEqual(self.segment.x_end, 4.0)
+        self.assertEqual(self.segment.dy, 40.0)
+        self.assertEqual(self.segment.len, 5.0)
+        self.assertEqual(self.segment.next_xy_start, (4.0, 6.0))
+
+    def test_serialize(self):
+        self.assertEqual(
+            serialize_balltracksegment(self.segment),
+            {"x_s": 1.0, "y_s": 2.0, "x_e": 4.0, "y_e": 6.0, "dx": 30.0, "dy": 40.0},
+        )
+
+
+class BallTrackBatchTestCase(SimpleTestCase):
+    def setUp(self):
+        self.config = get_test_subgame_config()
+        self.launches = [
+            (0.0, 0.0, 200.0, 100.0, 10.0),
+            (0.0, 0.0, 150.0, 500.0, 0.0),
+            (400.0, -120.0, -37.0, -1234.0, 3.0),
+            (-400.0, 300.0, 100.0, 100.0, 5.0),
+            (-400.0, 12.5, 80.0, -0.0, 7.0),
+        ]
+
+    def test_same_as_balltrack(self):
+        batch = BallTrackBatch(self.config, *zip(*self.launches))
+        bounce_points = batch.bounce_points
+        next_dx_dy = batch.next_dx_dy([100.0] * len(self.launches))
+
+        for idx, launch in enumerate(self.launches):
+            balltrack = BallTrack(self.config, *launch)
+            self.assertAlmostEqual(batch.y_impact[idx], balltrack.y_impact)
+            self.assertAlmostEqual(batch.t_end[idx], balltrack.t_end)
+            self.assertEqual(len(bounce_points[idx]), balltrack.n_bounces)
+            for (x_b, y_b), (x_s, y_s) in zip(
+                bounce_points[idx], balltrack.bounce_points
+            ):
+                self.assertAlmostEqual(x_b, x_s)
+                self.assertAlmostEqual(y_b, y_s)
+            for value_b, value_s in zip(next_dx_dy[idx], balltrack.next_dx_dy(100.0)):
+                self.assertAlmostEqual(value_b, value_s)
+
+
+class BallTrackCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.config = get_test_subgame_config()
+        self.cache = BallTrackCache(max_size=2)
+
+    def test_hit_shifts_time(self):
+        first = self.cache.get(self.config, 0.0, 0.0, 150.0, 500.0, 10.0)
+        second = self.cache.get(self.config, 0.0, 0.0, 150.0, 500.0, 20.0)
+
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertAlmostEqual(second.t_end - second.t_start, first.t_duration)
+        self.assertAlmostEqual(second.t_start, 20.0)
+        self.assertAlmostEqual(first.t_start, 10.0)
+        self.assertIs(
+            serialize_balltrack(second)["segments"],
+            serialize_balltrack(first)["segments"],
+        )
+        # launch state is quantized, thus close to but not exactly the same track
+        exact = BallTrack(self.config, 0.0, 0.0, 150.0, 500.0, 20.0)
+        self.assertAlmostEqual(second.y_impact, exact.y_impact, delta=self.config.e)
+        self.assertAlmostEqual(second.t_end, exact.t_end, places=3)
+
+    def test_hit_uses_config_of_caller(self):
+        other = get_test_subgame_config()
+        other.u_paddle = self.config.u_paddle * 2
+        first = self.cache.get(self.config, 0.0, 0.0, 150.0, 500.0, 0.0)
+        second = self.cache.get(other, 0.0, 0.0, 150.0, 500.0, 0.0)
+
+        self.assertEqual(self.cache.hits, 1)
+        self.assertIs(second.config, other)
+        _, dy_first = first.next_dx_dy(1.0)
+        _, dy_second = second.next_dx_dy(1.0)
+        self.assertAlmostEqual(dy_second - dy_first, self.config.u_paddle)
+
+    def test_lru_eviction(self):
+        self.cache.get(self.config, 0.0, 0.0, 150.0, 500.0, 0.0)
+        self.cache.get(self.config, 0.0, 0.0, 150.0, -500.0, 0.0)
+        self.cache.get(self.config, 0.0, 0.0, 150.0, 500.0, 0.0)  # hit, now recent
+        self.cache.get(self.config, 0.0, 0.0, -150.0, 500.0, 0.0)  # evicts 2nd
+
+        self.assertEqual(self.cache.evictions, 1)
+        self.cache.get(self.config, 0.0, 0.0, 150.0, 500.0, 0.0)
+        self.assertEqual(self.cache.hits, 2)
+        self.cache.get(self.config, 0.0, 0.0, 150.0, -500.0, 0.0)
+        self.assertEqual(self.cache.misses, 4)
+
+
+class RandomDxDyTestCase(SimpleTestCase):
+    def test_excluded_angles(self):
+        rng = random.Random(42)
+        for _ in range(1000):
+            dx, dy = get_random_dx_dy(200.0, 20, BallTrack.Heading.LEFT, rng=rng)
+            self.assertLess(dx, 0)
+            self.assertAlmostEqual(math.hypot(dx, dy), 200.0)
+            angle = math.degrees(math.atan2(abs(dy), abs(dx)))
+            self.assertTrue(20 <= angle <= 70, angle)
+
+    def test_same_seed_same_serves(self):
+        rng_a, rng_b = random.Random(7), random.Random(7)
+        serves_a = [get_random_dx_dy(200.0, 20, rng=rng_a) for _ in range(10)]
+        serves_b = [get_random_dx_dy(200.0, 20, rng=rng_b) for _ in range(10)]
+        self.assertEqual(serves_a, serves_b)
+
+
+class EventSchedulerTestCase(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.scheduler = EventScheduler()
+
+    async def test_due_callbacks_fire_in_one_wakeup(self):
+        fired = []
+        when = time.time() + 0.05
+        for idx in range(10):
+            self.scheduler.call_at(when, fired.append, idx)
+
+        await self.scheduler.sleep_until(when + 0.01)
+        self.assertEqual(fired, list(range(10)))
+        self.assertEqual(self.scheduler.n_fired, 11)  # + sleep_until itself
+        self.assertLessEqual(self.scheduler.n_wakeups, 2)
+
+    async def test_cancel_and_coroutine_callbacks(self):
+        fired = []
+
+        async def append_later(value):
+            await asyncio.sleep(0)
+            fired.append(value)
+
+        cancelled = self.scheduler.call_later(0.02, fired.append, "cancelled")
+        self.scheduler.call_later(0.01, append_later, "coroutine")
+        self.scheduler.call_later(0.03, fired.append, "function")
+        cancelled.cancel()
+
+        await self.scheduler.sleep(0.05)
+        await asyncio.sleep(0)
+        self.assertEqual(fired, ["coroutine", "function"])
+        self.assertEqual(len(self.scheduler), 0)
+
+    async def test_failures_are_logged_and_do_not_stall(self):
+        async def fail():
+            raise RuntimeError("coroutine failed")
+
+        fire_due = self.scheduler.fire_due
+        failed_once = []
+
+        def fire_due_failing_once():
+            if not failed_once:
+                failed_once.append(True)
+                raise RuntimeError("loop failed")
+            fire_due()
+
+        self.scheduler.fire_due = fire_due_failing_once
+        with self.assertLogs("livegame.livegame.scheduler", "ERROR") as logs:
+            self.scheduler.call_later(0.01, fail)
+            await asyncio.wait_for(self.scheduler.sleep(0.02), 1)
+            await asyncio.sleep(0)
+        self.assertIn("loop failed", logs.output[0])
+        self.assertIn("coroutine failed", logs.output[1])
+        self.assertEqual(len(self.scheduler.tasks), 0)
+
+
+class WireFormatTestCase(SimpleTestCase):
+    def test_balltrack_round_trip(self):
+        config = get_test_subgame_config()
+        balltrack = BallTrack(config, 0.0, 0.0, 150.0, 500.0, 1700000000.123)
+        packed = pack_balltrack(balltrack)
+        expected = serialize_balltrack(balltrack)
+        actual = unpack_balltrack(packed)
+
+        self.assertEqual(len(packed), 23 + 24 * len(balltrack.segments))
+        self.assertEqual(actual["heading"], expected["heading"])
+        self.assertAlmostEqual(actual["t_event"], expected["t_event"], places=3)
+        self.assertAlmostEqual(actual["t_end"], expected["t_end"], places=3)
+        self.assertEqual(len(actual["segments"]), len(expected["segments"]))
+        for seg_a, seg_e in zip(actual["segments"], expected["segments"]):
+            for key, value in seg_e.items():
+                self.assertAlmostEqual(seg_a[key], value, delta=0.1)
+
+
+class BallTrackDeltaTestCase(SimpleTestCase):
+    def setUp(self):
+        self.config = get_test_subgame_config()
+
+    # what the client does with the delta form
+    def reconstruct_segments(self, delta):
+        x_s, y_s, dx, dy = delta["x_s"], delta["y_s"], delta["dx"], delta["dy"]
+        y_wall = self.config.y_max if dy > 0 else self.config.y_min
+        segments = []
+        for x_e in delta["bounce_x"]:
+            segments.append((x_s, y_s, x_e, y_wall, dx, dy))
+            x_s, y_s, dy = x_e, y_wall, -dy
+            y_wall = self.config.y_max + self.config.y_min - y_wall
+        x_e = self.config.x_max if delta["heading"] == "RIGHT" else self.config.x_min
+        segments.append((x_s, y_s, x_e, delta["y_e"], dx, dy))
+        return segments
+
+    def test_reconstructs_full_track(self):
+        for launch in [
+            (0.0, 0.0, 150.0, 500.0, 0.0),
+            (400.0, -120.0, -37.0, -1234.0, 3.0),
+            (-400.0, 12.5, 80.0, 20.0, 7.0),
+        ]:
+            balltrack = BallTrack(self.config, *launch)
+            full = serialize_balltrack(balltrack)
+            delta = serialize_balltrack_delta(balltrack)
+            segments = self.reconstruct_segments(delta)
+
+            self.assertEqual(len(segments), len(full["segments"]))
+            for seg_r, seg_f in zip(segments, full["segments"]):
+                for value_r, key in zip(
+                    seg_r, ("x_s", "y_s", "x_e", "y_e", "dx", "dy")
+                ):
+                    self.assertAlmostEqual(value_r, seg_f[key], delta=0.1)
+            self.assertLess(len(str(delta)), len(str(full)))
+
+
+class FakeTimedSession:
+    def __init__(self, t_limit_end):
+        self.t_limit_end = t_limit_end
+        self.emitted = []
+
+    def get_time_left(self, now):
+        return max(0, math.ceil(self.t_limit_end - now))
+
+    async def emit_update_time_left(self, time_left, t_event):
+        self.emitted.append((time_left, t_event))
+
+
+class TimeLeftBroadcasterTestCase(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.broadcaster = TimeLeftBroadcaster(EventScheduler())
+
+    async def test_one_tick_for_all_sessions(self):
+        now = time.time()
+        sessions = [FakeTimedSession(now + 10.5), FakeTimedSession(now + 3.5)]
+        ended = FakeTimedSession(now - 1)
+        for session in sessions + [ended]:
+            self.broadcaster.register(session)
+        self.assertIsNotNone(self.broadcaster.timer)
+        self.assertEqual(self.broadcaster.timer.when, math.floor(now) + 1)
+
+        await self.broadcaster.tick()
+        self.assertEqual(self.broadcaster.n_ticks, 1)
+        self.assertEqual(sessions[0].emitted[0][0], 11)
+        self.assertEqual(sessions[1].emitted[0][0], 4)
+        self.assertEqual(sessions[0].emitted[0][1], sessions[1].emitted[0][1])
+        # last update_time_left(0) is sent once, then session is dropped
+        self.assertEqual(ended.emitted[0][0], 0)
+        self.assertNotIn(ended, self.broadcaster.sessions)
+
+        for session in sessions:
+            self.broadcaster.unregister(session)
+        self.assertIsNone(self.broadcaster.timer)
+
+    def test_client_options(self):
+        options = parse_client_options({"QUERY_STRING": "EIO=4&time_left=client"})
+        self.assertTrue(options.time_left_by_client)
+        self.assertFalse(options.binary)
+        options = parse_client_options({"QUERY_STRING": "encoding=binary"})
+        self.assertTrue(options.binary)
+        self.assertFalse(parse_client_options({}).time_left_by_client)
+
+
+class FakeSubGame:
+    def __init__(self, subgame_id, intra_id_a, intra_id_b):
+        self.subgame_id = subgame_id
+        self.intra_id_a = intra_id_a
+        self.intra_id_b = intra_id_b
+        self.sid_to_player = {}
+        self.inputs = []
+        self.closed = False
+
+    async def join(self, sid, intra_id, options):
+        self.sid_to_player[sid] = intra_id
+        return True
+
+    def leave(self, sid):
+        del self.sid_to_player[sid]
+
+    async def close(self):
+        self.closed = True
+
+    async def on_keyboard_input(self, sid, data):
+        self.inputs.append((sid, data))
+
+
+class LiveGameNamespaceTestCase(IsolatedAsyncioTestCase):
+    async def test_routes_events_across_ranks(self):
+        namespace = LiveGameNamespace()
+        await namespace.add_client("sid_a", "alice", ClientOptions())
+        await namespace.add_client("sid_b", "bob", ClientOptions())
+
+        semi_final = FakeSubGame("1/1/0", "alice", "bob")
+        await namespace.register_subgame(semi_final)
+        self.assertEqual(semi_final.sid_to_player, {"sid_a": "alice", "sid_b": "bob"})
+        await namespace.on_keyboard_input("sid_a", {"key": "UP"})
+        self.assertEqual(semi_final.inputs, [("sid_a", {"key": "UP"})])
+
+        await namespace.unregister_subgame(semi_final)
+        self.assertTrue(semi_final.closed)
+        await namespace.on_keyboard_input("sid_a", {"key": "UP"})
+        self.assertEqual(len(semi_final.inputs), 1)
+
+        # next rank reuses the same connection, and a late sid joins on connect
+        final = FakeSubGame("1/0/0", "alice", "carol")
+        await namespace.register_subgame(final)
+        await namespace.add_client("sid_c", "carol", ClientOptions())
+        self.assertEqual(set(final.sid_to_player), {"sid_a", "sid_c"})
+
+        await namespace.on_disconnect("sid_c")
+        self.assertEqual(set(final.sid_to_player), {"sid_a"})
+        self.assertNotIn("carol", namespace.intra_id_to_sids)
+
+
+class SaveGameResultTestCase(TestCase):
+    final_ranks = {
+        "player0": -1,
+        "player4": 0,
+        "player2": 1,
+        "player6": 1,
+        "player1": 2,
+        "player3": 2,
+        "player5": 2,
+        "player7": 2,
+    }
+
+    def setUp(self):
+        self.intra_ids = [f"player{idx}" for idx in range(8)]
+        users = [
+            User.objects.create(intra_id=intra_id, username=intra_id)
+            for intra_id in self.intra_ids
+        ]
+        self.game = Game.objects.create(n_players=8)
+        self.game_room = GameRoom.objects.create(
+            host=users[0], game=self.game, title="room"
+        )
+        for user in users:
+            GamePlayer.objects.create(user=user, game=self.game)
+
+    # player with the smaller index always wins
+    def get_rows(self):
+        rows = []
+        alive = list(self.intra_ids)
+        for rank in (2, 1, 0):
+            winners = []
+            for idx_in_rank in range(len(alive) // 2):
+                intra_id_a, intra_id_b = alive[idx_in_rank * 2 : idx_in_rank * 2 + 2]
+                rows.append(
+                    SubGameRow(
+                        rank, idx_in_rank, intra_id_a, intra_id_b, 5, 3, "A", 1.0, 2.0
+                    )
+                )
+                winners.append(intra_id_a)
+            alive = winners
+        return rows
+
+    def get_ranks(self):
+        return dict(
+            GamePlayer.objects.filter(game=self.game).values_list("user_id", "rank")
+        )
+
+    def test_constant_number_of_queries(self):
+        # savepoint, players, subgames, ranks, release savepoint
+        with self.assertNumQueries(5):
+            write_subgame_rows([(self.game, row) for row in self.get_rows()])
+
+        self.assertEqual(SubGame.objects.filter(game=self.game).count(), 7)
+        # not in history before the game ends
+        self.assertEqual(self.game.users.count(), 0)
+        self.assertEqual(self.get_ranks(), self.final_ranks)
+
+    def test_lobby_sees_new_ranks(self):
+        for intra_id in self.intra_ids:
+            Profile.objects.create(
+                user_id=intra_id, nickname=intra_id, email=f"{intra_id}@example.com"
+            )
+        LOBBY_SNAPSHOT.clear()
+        LOBBY_SNAPSHOT.get(None)
+        with self.captureOnCommitCallbacks(execute=True):
+            write_subgame_rows([(self.game, row) for row in self.get_rows()])
+        self.assertEqual(LOBBY_SNAPSHOT.dirty, {self.game.pk})
+
+        _, rooms = LOBBY_SNAPSHOT.get(None)
+        ranks = [player["rank"] for player in rooms[0]["players"]]
+        self.assertEqual(ranks, [self.final_ranks[key] for key in self.intra_ids])
+
+    def test_write_behind_by_rank(self):
+        writer = SubGameResultWriter(max_size=2, batch_size=4)
+        rows = self.get_rows()
+
+        async def save():
+            for rank in (2, 1, 0):
+                for row in rows:
+                    if row.rank == rank:
+                        await writer.put(self.game, row)
+                self.assertTrue(await writer.flush(self.game))
+                self.assertEqual(
+                    await sync_to_async(SubGame.objects.filter(rank=rank).count)(),
+                    2**rank,
+                )
+                self.assertEqual(await sync_to_async(self.game.users.count)(), 0)
+            await finish_game(self.game, self.game_room.pk)
+
+        # worker threads cannot see the data of the test transaction
+        with mock.patch.object(DB_EXECUTOR, "max_workers", 0):
+            async_to_sync(save)()
+        self.assertEqual(writer.to_dict()["written"], 7)
+        self.assertEqual(writer.to_dict()["failed"], 0)
+        self.assertEqual(self.game.users.count(), 8)
+        self.assertFalse(GameRoom.objects.filter(pk=self.game_room.pk).exists())
+        self.assertEqual(self.get_ranks(), self.final_ranks)
+
+    def get_ghost_game(self):
+        ghost = Game.objects.create(n_players=2)
+        Game.objects.filter(pk=ghost.pk).delete()
+        return ghost
+
+    def test_deleted_game_is_skipped(self):
+        ghost = self.get_ghost_game()
+        row = SubGameRow(0, 0, "player0", "player1", 5, 3, "A", 1.0, 2.0)
+        batch = [(ghost, row)] + [(self.game, row) for row in self.get_rows()]
+
+        self.assertEqual(write_subgame_rows(batch), {ghost.pk})
+        self.assertEqual(SubGame.objects.count(), 7)
+        self.assertEqual(self.get_ranks(), self.final_ranks)
+
+    def test_failing_game_does_not_fail_others(self):
+        writer = SubGameResultWriter(max_size=16, batch_size=16)
+        broken = Game.objects.create(n_players=2)
+        idle = Game.objects.create(n_players=2)
+
+        def write_or_fail(batch):
+            if any(game.pk == broken.pk for game, _ in batch):
+                raise RuntimeError("broken")
+            return write_subgame_rows(batch)
+
+        async def save():
+            row = SubGameRow(0, 0, "player0", "player1", 5, 3, "A", 1.0, 2.0)
+            await writer.put(broken, row)
+            for row in self.get_rows():
+                await writer.put(self.game, row)
+            # nothing of its own to wait for, whatever the other rooms queued
+            self.assertTrue(await writer.flush(idle))
+            self.assertTrue(await writer.flush(self.game))
+            self.assertFalse(await writer.flush(broken))
+
+        with mock.patch.object(DB_EXECUTOR, "max_workers", 0), mock.patch(
+            "livegame.result_writer.write_subgame_rows", write_or_fail
+        ):
+            async_to_sync(save)()
+        self.assertEqual(writer.to_dict()["written"], 7)
+        self.assertEqual(writer.to_dict()["failed"], 1)
+        self.assertEqual(writer.to_dict()["pending_games"], 0)
+        self.assertEqual(self.get_ranks(), self.final_ranks)
+
+
+class FakeGameRoomSession:
+    save_subgame_result = GameRoomSession.save_subgame_result
+
+    def __init__(self, game):
+        self.game = game
+        self.game_room_id = game.pk
+        self.session = None
+        self.reported = []
+
+    async def report_winner_of_subgame(self, idx_rank, idx_in_rank, winner):
+        self.reported.append(winner)
+        for paddle in self.session.paddles.values():
+            paddle.ack_status = PaddleAckStatus.ENDED
+
+
+class SubGameEndTestCase(TestCase):
+    def setUp(self):
+        users = [
+            User.objects.create(intra_id=intra_id, username=intra_id)
+            for intra_id in ("alice", "bob")
+        ]
+        self.game = Game.objects.create(is_tournament=False)
+        for user in users:
+            GamePlayer.objects.create(user=user, game=self.game)
+
+        self.config = get_test_subgame_config()
+        self.config.t_delay_subgame_start = 0.01
+        self.config.t_delay_retry_network = 0.01
+        # time limit reached while the first ball is still traveling
+        self.config.v_ball = 1000
+        self.config.t_limit = 0.1
+
+    def test_time_limit_with_leader_saves_once(self):
+        gr_session = FakeGameRoomSession(self.game)
+        session = SubGameSession(self.config, gr_session, "alice", "bob", 0, 0)
+        gr_session.session = session
+        for paddle in session.paddles.values():
+            paddle.ack_status = PaddleAckStatus.STARTED
+        session.paddles[Player.A].score = 1
+
+        async def play():
+            await session.start()
+            await SUBGAME_RESULT_WRITER.flush(self.game)
+
+        # worker threads cannot see the data of the test transaction
+        with mock.patch.object(DB_EXECUTOR, "max_workers", 0):
+            async_to_sync(play)()
+
+        self.assertTrue(session.time_over)
+        self.assertEqual(session.winner, Player.A)
+        self.assertEqual(gr_session.reported, [Player.A])
+        subgames = SubGame.objects.filter(game=self.game)
+        self.assertEqual(subgames.count(), 1)
+        self.assertEqual((subgames[0].point_a, subgames[0].point_b), (1, 0))
+
+
+class DBExecutorTestCase(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.executor = DBExecutor(max_workers=2, max_pending=3)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    async def test_runs_on_worker_threads(self):
+        names = await asyncio.gather(
+            *(
+                self.executor.run(lambda: threading.current_thread().name)
+                for _ in range(5)
+            )
+        )
+        self.assertTrue(all(name.startswith("livegame-db") for name in names))
+        self.assertEqual(self.executor.to_dict()["calls"], 5)
+
+    async def test_bounded_pending(self):
+        release = threading.Event()
+        tasks = [asyncio.create_task(self.executor.run(release.wait)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        metrics = self.executor.to_dict()
+        self.assertEqual(metrics["running"], 2)
+        self.assertEqual(metrics["queued"], 1)
+        self.assertEqual(metrics["waiting"], 2)
+
+        release.set()
+        await asyncio.gather(*tasks)
+        metrics = self.executor.to_dict()
+        self.assertEqual(metrics["calls"], 5)
+        self.assertEqual(metrics["waiting"] + metrics["queued"], 0)
+        self.assertGreater(metrics["max_wait"], 0)
+
+    async def test_errors_are_raised(self):
+        with self.assertRaises(ZeroDivisionError):
+            await self.executor.run(lambda: 1 / 0)
+        self.assertEqual(self.executor.to_dict()["errors"], 1)
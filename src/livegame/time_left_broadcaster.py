@@ -0,0 +1,73 @@
+import math
+import time
+import asyncio
+import logging
+from typing import Dict, Union
+
+from .precision_config import get_time
+from .scheduler import SCHEDULER, EventScheduler, TimerHandle
+
+
+# Emits @update_time_left of every running SubGameSession on one shared tick
+# aligned to wall-clock seconds, instead of one timer per subgame.
+# Registered sessions must provide get_time_left(now) and
+# emit_update_time_left(time_left, t_event).
+class TimeLeftBroadcaster:
+    logger = logging.getLogger(f"{__package__}.TimeLeftBroadcaster")
+
+    def __init__(self, scheduler: EventScheduler = SCHEDULER) -> None:
+        self.scheduler = scheduler
+        self.sessions: Dict[object, None] = {}  # insertion ordered set
+        self.timer: Union[None, TimerHandle] = None
+        self.n_ticks = 0
+        self.n_emits = 0
+
+    def register(self, session) -> None:
+        self.sessions[session] = None
+        if self.timer is None:
+            self.schedule_next_tick()
+
+    def unregister(self, session) -> None:
+        self.sessions.pop(session, None)
+        if not self.sessions and self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def schedule_next_tick(self) -> None:
+        self.timer = self.scheduler.call_at(math.floor(time.time()) + 1, self.tick)
+
+    async def tick(self) -> None:
+        self.timer = None
+        self.n_ticks += 1
+        now = time.time()
+        t_event = get_time()
+
+        emits = []
+        for session in list(self.sessions):
+            time_left = session.get_time_left(now)
+            if time_left is None:  # session is not running anymore
+                self.unregister(session)
+                continue
+            if time_left <= 0:
+                self.unregister(session)
+            emits.append(session.emit_update_time_left(time_left, t_event))
+
+        if self.sessions:
+            self.schedule_next_tick()
+
+        if emits:
+            results = await asyncio.gather(*emits, return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    self.logger.error(f"Error in update_time_left: {result}")
+            self.n_emits += len(emits)
+        self.logger.debug("Tick %s emitted update_time_left to %s", now, len(emits))
+
+    def __str__(self) -> str:
+        return (
+            f"TimeLeftBroadcaster sessions={len(self.sessions)} "
+            f"ticks={self.n_ticks} emits={self.n_emits}"
+        )
+
+
+TIME_LEFT_BROADCASTER = TimeLeftBroadcaster()
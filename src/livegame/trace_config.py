@@ -0,0 +1,6 @@
+from pong.settings import LOGLEVEL_TRACE_ENABLE
+
+# Evaluated once at import time, not on every trace() call.
+# trace() methods take %-style args so that messages (which often contain whole
+# BallTrack or Paddle) are formatted only when tracing is enabled.
+TRACE_ENABLED = LOGLEVEL_TRACE_ENABLE != "0"
@@ -8,6 +8,9 @@ django.setup()
 from django.core.asgi import get_asgi_application
 from socketcontrol.events import sio
 from friends.online_status_namespace import OnlineStatusNamespace
+from livegame.livegame_namespace import LIVEGAME_NAMESPACE
+from game.lobby_namespace import LOBBY_NAMESPACE
+from socketcontrol.presence_registry import PRESENCE_REGISTRY
 
 # pylint: enable=wrong-import-position
 
@@ -15,8 +18,14 @@ from friends.online_status_namespace import OnlineStatusNamespace
 django_asgi_app = get_asgi_application()
 
 
-socketio_app = socketio.ASGIApp(sio, django_asgi_app)
+async def on_shutdown():
+    await PRESENCE_REGISTRY.shutdown()
+
+
+socketio_app = socketio.ASGIApp(sio, django_asgi_app, on_shutdown=on_shutdown)
 
 sio.register_namespace(OnlineStatusNamespace())
+sio.register_namespace(LIVEGAME_NAMESPACE)
+sio.register_namespace(LOBBY_NAMESPACE)
 
 application = socketio_app
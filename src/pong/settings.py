@@ -105,6 +105,12 @@ DATABASES = {
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD"),
         "HOST": os.environ.get("DB_HOST"),
         "PORT": 5432,
+        # DB_CONN_MAX_AGE (seconds) keeps connections open for reuse, in every
+        # thread of the app (request handlers and livegame DB workers alike):
+        # up to one connection per thread, mind max_connections of Postgres.
+        # Default 0: closed at the end of each request / DB worker call.
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", "0")),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
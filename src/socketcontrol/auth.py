@@ -0,0 +1,65 @@
+import logging
+from typing import Union
+
+from rest_framework_simplejwt.tokens import AccessToken
+from asgiref.sync import sync_to_async
+
+from pong import settings
+from accounts.models import User
+from .token_cache import TOKEN_USER_CACHE
+
+logger = logging.getLogger(f"{__package__}.{__name__}")
+
+AUTH_COOKIE_PREFIX = settings.SIMPLE_JWT["AUTH_COOKIE"] + "="
+
+
+# Finds the access token cookie in a raw Cookie header without splitting the
+# whole header, and keeps any '=' inside the value
+def get_token_from_cookie_header(cookies: str) -> Union[None, str]:
+    idx = cookies.find(AUTH_COOKIE_PREFIX)
+    while idx != -1:
+        # skip cookies whose name merely ends with the auth cookie name
+        if idx == 0 or cookies[idx - 1] in "; ":
+            start = idx + len(AUTH_COOKIE_PREFIX)
+            end = cookies.find(";", start)
+            token = cookies[start:] if end == -1 else cookies[start:end]
+            return token.strip() or None
+        idx = cookies.find(AUTH_COOKIE_PREFIX, idx + 1)
+    return None
+
+
+def get_token_from_environ(environ: dict) -> Union[None, str]:
+    return get_token_from_cookie_header(environ.get("HTTP_COOKIE", ""))
+
+
+@sync_to_async
+def fetch_user_by_token(token):
+    validated_token = AccessToken(token)
+    intra_id = validated_token["intra_id"]
+    user = User.objects.get(intra_id=intra_id)
+    return validated_token.payload, user
+
+
+# Validated tokens are cached (see token_cache.py), thus reconnecting to each
+# namespace does not verify the token and query the user again
+async def get_user_by_token(token):
+    cached = TOKEN_USER_CACHE.get(token)
+    if cached is not None:
+        return cached[1]
+    claims, user = await fetch_user_by_token(token)
+    TOKEN_USER_CACHE.put(token, claims, user)
+    return user
+
+
+# Connect-auth pipeline shared by every namespace: cookie -> token -> user.
+# Returns None (and logs why) if the connection should be refused.
+async def get_user_from_environ(environ: dict) -> Union[None, User]:
+    token = get_token_from_environ(environ)
+    if not token:
+        logger.warning("No token")
+        return None
+    try:
+        return await get_user_by_token(token)
+    except Exception as e:
+        logger.warning(f"Invalid token: {e}")
+        return None
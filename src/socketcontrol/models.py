@@ -6,9 +6,11 @@ class SocketSession(models.Model):
     user = models.OneToOneField(
         User, on_delete=models.CASCADE, related_name="socket_session"
     )
-    session_id = models.CharField(max_length=128)
-    online_session_id = models.CharField(max_length=128, null=True)
-    game_room_session_id = models.CharField(max_length=128, null=True)
+    # sids are looked up by value (i.e. admin, ad-hoc queries), thus indexed;
+    # the socket handlers themselves resolve sid -> user in memory
+    session_id = models.CharField(max_length=128, db_index=True)
+    online_session_id = models.CharField(max_length=128, null=True, db_index=True)
+    game_room_session_id = models.CharField(max_length=128, null=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
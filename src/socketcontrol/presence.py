@@ -0,0 +1,60 @@
+import logging
+from typing import List, Tuple
+
+import socketio
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+
+from accounts.models import User
+from friends.models import Friend
+from friends.serializers import FriendUserSerializer
+from .models import SocketSession
+from .presence_registry import PRESENCE_REGISTRY
+
+logger = logging.getLogger(f"{__package__}.{__name__}")
+
+
+# /online_status sids of the user's online friends, in one query
+@sync_to_async
+def get_friend_sids(user: User) -> List[Tuple[str, str]]:
+    friends = Friend.objects.filter(status="friend")
+    return list(
+        SocketSession.objects.filter(
+            Q(user__in=friends.filter(requester=user).values("receiver"))
+            | Q(user__in=friends.filter(receiver=user).values("requester")),
+            online_session_id__isnull=False,
+        ).values_list("user_id", "online_session_id")
+    )
+
+
+async def get_online_friend_sids(user: User) -> List[str]:
+    friend_sids = await get_friend_sids(user)
+    online = PRESENCE_REGISTRY.get_online(intra_id for intra_id, _ in friend_sids)
+    return [sid for intra_id, sid in friend_sids if intra_id in online]
+
+
+@sync_to_async
+def serialize_friend_user(user: User) -> dict:
+    return FriendUserSerializer(user).data
+
+
+# Tells every online friend of the user that the user went online / offline,
+# with a single emit to all of their sids
+async def fan_out_presence(
+    server: socketio.AsyncServer, user: User, is_online: bool
+) -> int:
+    sids = await get_online_friend_sids(user)
+    if not sids:
+        return 0
+
+    user_info = await serialize_friend_user(user)
+    user_info.update({"is_online": is_online})
+    # SIO: B>F update_friends
+    await server.emit(
+        "update_friends",
+        {"friend": user_info},
+        to=sids,
+        namespace="/online_status",
+    )
+    logger.debug(f"update_friends of {user.intra_id} sent to {len(sids)} friends")
+    return len(sids)
@@ -0,0 +1,207 @@
+import os
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Dict, Iterable, Set, Tuple, Union
+
+from asgiref.sync import sync_to_async
+from django.utils.module_loading import import_string
+
+from accounts.models import User
+
+logger = logging.getLogger(f"{__package__}.{__name__}")
+
+
+# Keeps sids of online users in this process.
+# A backend shared by workers (e.g. on redis) has to provide the same methods.
+class LocalPresenceBackend:
+    def __init__(self) -> None:
+        self.intra_id_to_sids: Dict[str, Set[str]] = {}
+        self.sid_to_intra_id: Dict[str, str] = {}
+        # read by sync views (i.e. FriendSerializer) in worker threads
+        self.lock = threading.Lock()
+
+    # returns the number of sids of the user after adding
+    def add(self, intra_id: str, sid: str) -> int:
+        with self.lock:
+            self.sid_to_intra_id[sid] = intra_id
+            sids = self.intra_id_to_sids.setdefault(intra_id, set())
+            sids.add(sid)
+            return len(sids)
+
+    # returns the owner of the sid and the number of sids it has left
+    def remove(self, sid: str) -> Tuple[Union[None, str], int]:
+        with self.lock:
+            intra_id = self.sid_to_intra_id.pop(sid, None)
+            if intra_id is None:
+                return None, 0
+            sids = self.intra_id_to_sids.get(intra_id, set())
+            sids.discard(sid)
+            if not sids:
+                self.intra_id_to_sids.pop(intra_id, None)
+            return intra_id, len(sids)
+
+    def get_online(self, intra_ids: Iterable[str]) -> Set[str]:
+        with self.lock:
+            return {
+                intra_id for intra_id in intra_ids if intra_id in self.intra_id_to_sids
+            }
+
+    def clear(self) -> None:
+        with self.lock:
+            self.intra_id_to_sids.clear()
+            self.sid_to_intra_id.clear()
+
+
+# Source of truth of online status.
+# A user is online while at least one of their sids (e.g. browser tabs) is
+# connected. User.is_online is only a copy for the DB, written in batches at
+# most every `flush_delay` seconds.
+# Closing the last sid is only final after `debounce` seconds: a reload or a
+# mobile reconnect within the window is an offline-online flap, and neither
+# half of it is broadcast nor persisted. The window is waited out by a task
+# of its own, not by the disconnect handler.
+class PresenceRegistry:
+    def __init__(self, backend, flush_delay: float, debounce: float) -> None:
+        self.backend = backend
+        self.flush_delay = flush_delay
+        self.debounce = debounce
+        self.pending: Dict[str, bool] = {}  # intra_id -> is_online to persist
+        self.flush_task: Union[None, asyncio.Task] = None
+        # intra_id -> task of the disconnect waiting out the debounce window
+        self.going_offline: Dict[str, asyncio.Task] = {}
+        self.n_flushes = 0
+        self.n_online = 0
+        self.n_offline = 0
+        self.n_suppressed = 0  # transitions not broadcast thanks to debouncing
+
+    # returns True if the user just went online
+    def connect(self, intra_id: str, sid: str) -> bool:
+        if self.backend.add(intra_id, sid) != 1:
+            return False
+        going_offline = self.going_offline.pop(intra_id, None)
+        if going_offline is not None:
+            going_offline.cancel()
+            self.n_suppressed += 2  # both offline and online
+            return False
+        self.n_online += 1
+        self.set_pending(intra_id, True)
+        return True
+
+    # returns at once; if that was the last sid of its owner, `on_offline` is
+    # called with it once it stayed offline for the debounce window.
+    # returns the task waiting for that, if any
+    def disconnect(
+        self, sid: str, on_offline: Callable[[str], Awaitable[None]]
+    ) -> Union[None, asyncio.Task]:
+        intra_id, n_sids = self.backend.remove(sid)
+        if intra_id is None or n_sids > 0:
+            return None
+
+        task = asyncio.get_running_loop().create_task(
+            self.go_offline(intra_id, on_offline)
+        )
+        self.going_offline[intra_id] = task
+        return task
+
+    # cancelled by connect if the user comes back within the window
+    async def go_offline(
+        self, intra_id: str, on_offline: Callable[[str], Awaitable[None]]
+    ) -> None:
+        await asyncio.sleep(self.debounce)
+        del self.going_offline[intra_id]
+
+        self.n_offline += 1
+        self.set_pending(intra_id, False)
+        try:
+            await on_offline(intra_id)
+        except Exception as e:
+            logger.error(f"Error while going offline {intra_id}: {e}")
+
+    # users within the debounce window are still online for everyone else
+    def is_online(self, intra_id: str) -> bool:
+        return bool(self.get_online([intra_id]))
+
+    def get_online(self, intra_ids: Iterable[str]) -> Set[str]:
+        intra_ids = list(intra_ids)
+        online = self.backend.get_online(intra_ids)
+        online.update(
+            intra_id for intra_id in intra_ids if intra_id in self.going_offline
+        )
+        return online
+
+    def set_pending(self, intra_id: str, is_online: bool) -> None:
+        self.pending[intra_id] = is_online
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.get_running_loop().create_task(self.flush_later())
+
+    async def flush_later(self) -> None:
+        await asyncio.sleep(self.flush_delay)
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Error while persisting online status: {e}")
+        # changed while writing: set_pending saw this task still running
+        self.flush_task = None
+        if self.pending:
+            self.flush_task = asyncio.get_running_loop().create_task(self.flush_later())
+
+    # takes the pending status on the event loop, then writes it in a thread
+    async def flush(self) -> None:
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        try:
+            await sync_to_async(self.write)(pending)
+        except Exception:
+            # retried with the next flush, unless changed in the meantime
+            for intra_id, is_online in pending.items():
+                self.pending.setdefault(intra_id, is_online)
+            raise
+
+    # writes online status with at most two UPDATE queries
+    def write(self, pending: Dict[str, bool]) -> None:
+        online = [intra_id for intra_id, is_online in pending.items() if is_online]
+        offline = [intra_id for intra_id, is_online in pending.items() if not is_online]
+        if online:
+            User.objects.filter(intra_id__in=online).update(is_online=True)
+        if offline:
+            User.objects.filter(intra_id__in=offline).update(is_online=False)
+        self.n_flushes += 1
+        logger.debug(f"persisted online {len(online)}, offline {len(offline)} users")
+
+    # on server shutdown: nothing pending is lost
+    async def shutdown(self) -> None:
+        # the process goes away with every sid
+        for intra_id, task in self.going_offline.items():
+            task.cancel()
+            self.pending[intra_id] = False
+        self.going_offline.clear()
+        if self.flush_task is not None and not self.flush_task.done():
+            self.flush_task.cancel()
+        self.flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Error while persisting online status: {e}")
+
+    def to_dict(self) -> dict:
+        return {
+            "online": self.n_online,
+            "offline": self.n_offline,
+            "suppressed": self.n_suppressed,
+            "going_offline": len(self.going_offline),
+            "pending": len(self.pending),
+            "flushes": self.n_flushes,
+        }
+
+
+PRESENCE_REGISTRY = PresenceRegistry(
+    backend=import_string(
+        os.environ.get(
+            "PRESENCE_BACKEND", "socketcontrol.presence_registry.LocalPresenceBackend"
+        )
+    )(),
+    flush_delay=float(os.environ.get("PRESENCE_FLUSH_DELAY", "1")),
+    debounce=float(os.environ.get("PRESENCE_DEBOUNCE", "2")),
+)
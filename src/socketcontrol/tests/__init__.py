@@ -0,0 +1,240 @@
+import time
+import asyncio
+
+import socketio
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import Profile, User
+from friends.models import Friend
+from ..models import SocketSession
+from ..presence import fan_out_presence, get_online_friend_sids
+from ..presence_registry import (
+    PRESENCE_REGISTRY,
+    LocalPresenceBackend,
+    PresenceRegistry,
+)
+from ..auth import get_token_from_cookie_header, get_user_by_token
+from .fake_server import FakeServer
+from ..token_cache import TOKEN_USER_CACHE, TokenUserCache
+
+
+class SocketIOTestCase(TestCase):
+    def setUp(self):
+        self.sio = socketio.Client()
+
+    def test_connect_and_disconnect(self):
+        @self.sio.event
+        def connect():
+            print("I'm connected!")
+
+        @self.sio.event
+        def disconnect():
+            print("I'm disconnected!")
+
+        self.sio.connect("http://localhost:8000")
+        self.assertTrue(self.sio.connected)  # 연결이 성공했는지 확인
+        self.sio.disconnect()
+        self.assertFalse(self.sio.connected)  # 연결이 종료되었는지 확인
+
+
+class TokenUserCacheTestCase(TestCase):
+    def setUp(self):
+        TOKEN_USER_CACHE.clear()
+        self.user = User.objects.create(intra_id="cadet", username="cadet")
+        self.token = str(AccessToken.for_user(self.user))
+
+    def test_second_connect_hits_cache(self):
+        with self.assertNumQueries(1):
+            user = async_to_sync(get_user_by_token)(self.token)
+        with self.assertNumQueries(0):
+            cached_user = async_to_sync(get_user_by_token)(self.token)
+
+        self.assertEqual(cached_user.pk, user.pk)
+        self.assertEqual(cached_user.username, "cadet")
+        self.assertIsNot(cached_user, user)
+
+    def test_respects_exp_and_invalidation(self):
+        cache = TokenUserCache(max_size=2, ttl=300)
+        cache.put(self.token, {"intra_id": "cadet", "exp": time.time() - 1}, self.user)
+        self.assertIsNone(cache.get(self.token))
+
+        cache.put(self.token, {"intra_id": "cadet", "exp": time.time() + 60}, self.user)
+        self.assertIsNotNone(cache.get(self.token))
+        cache.invalidate_user("cadet")
+        self.assertIsNone(cache.get(self.token))
+        self.assertEqual(cache.to_dict()["size"], 0)
+
+
+class CookieTokenTestCase(TestCase):
+    def test_get_token_from_cookie_header(self):
+        self.assertEqual(
+            get_token_from_cookie_header("csrftoken=abc; pp_access_token=a.b=.c="),
+            "a.b=.c=",
+        )
+        self.assertEqual(
+            get_token_from_cookie_header("x_pp_access_token=no;pp_access_token=yes"),
+            "yes",
+        )
+        self.assertIsNone(get_token_from_cookie_header("pp_access_token_x=no"))
+        self.assertIsNone(get_token_from_cookie_header("pp_access_token="))
+        self.assertIsNone(get_token_from_cookie_header(""))
+
+
+class PresenceFanOutTestCase(TestCase):
+    def create_user(self, intra_id, is_online, sid=None):
+        user = User.objects.create(intra_id=intra_id, username=intra_id)
+        if is_online:
+            PRESENCE_REGISTRY.backend.add(intra_id, f"default_{intra_id}")
+        Profile.objects.create(
+            user=user, nickname=intra_id, email=f"{intra_id}@example.com"
+        )
+        SocketSession.objects.create(
+            user=user, session_id=f"default_{intra_id}", online_session_id=sid
+        )
+        return user
+
+    def setUp(self):
+        PRESENCE_REGISTRY.backend.clear()
+        self.user = self.create_user("cadet", True, "sid_cadet")
+        for idx in range(20):
+            friend = self.create_user(f"friend{idx}", idx % 2 == 0, f"sid_{idx}")
+            if idx % 4 == 0:
+                Friend.objects.create(
+                    requester=self.user, receiver=friend, status="friend"
+                )
+            else:
+                Friend.objects.create(
+                    requester=friend, receiver=self.user, status="friend"
+                )
+        stranger = self.create_user("stranger", True, "sid_stranger")
+        Friend.objects.create(requester=stranger, receiver=self.user)  # pending
+
+    def test_online_friend_sids_in_one_query(self):
+        with self.assertNumQueries(1):
+            sids = async_to_sync(get_online_friend_sids)(self.user)
+        self.assertEqual(sorted(sids), sorted(f"sid_{idx}" for idx in range(0, 20, 2)))
+
+    def test_single_batched_emit(self):
+        server = FakeServer()
+        user = User.objects.get(intra_id="cadet")
+        with self.assertNumQueries(2):  # online friend sids + profile
+            n_sent = async_to_sync(fan_out_presence)(server, user, False)
+
+        self.assertEqual(n_sent, 10)
+        self.assertEqual(len(server.emitted), 1)
+        event, data, to, namespace = server.emitted[0]
+        self.assertEqual((event, namespace), ("update_friends", "/online_status"))
+        self.assertEqual(len(to), 10)
+        self.assertEqual(data["friend"]["intra_id"], "cadet")
+        self.assertFalse(data["friend"]["is_online"])
+
+
+class PresenceRegistryTestCase(TestCase):
+    def setUp(self):
+        self.registry = PresenceRegistry(
+            LocalPresenceBackend(), flush_delay=0, debounce=0
+        )
+        for intra_id in ("alice", "bob"):
+            User.objects.create(intra_id=intra_id, username=intra_id)
+        self.went_offline = []
+
+    async def on_offline(self, intra_id):
+        self.went_offline.append(intra_id)
+
+    def test_refcount_and_batched_persist(self):
+        self.registry.flush_delay = 60
+
+        async def scenario():
+            self.assertTrue(self.registry.connect("alice", "tab1"))
+            self.assertFalse(self.registry.connect("alice", "tab2"))
+            self.assertTrue(self.registry.connect("bob", "tab3"))
+            # tab2 still open
+            self.assertIsNone(self.registry.disconnect("tab1", self.on_offline))
+            await self.registry.disconnect("tab3", self.on_offline)
+            self.assertIsNone(self.registry.disconnect("unknown", self.on_offline))
+            self.assertEqual(self.registry.get_online(["alice", "bob"]), {"alice"})
+            self.registry.flush_task.cancel()
+            return dict(self.registry.pending)
+
+        pending = async_to_sync(scenario)()
+        self.assertEqual(pending, {"alice": True, "bob": False})
+        self.assertEqual(self.went_offline, ["bob"])
+        with self.assertNumQueries(2):
+            async_to_sync(self.registry.flush)()
+        self.assertTrue(User.objects.get(intra_id="alice").is_online)
+        self.assertFalse(User.objects.get(intra_id="bob").is_online)
+        self.assertEqual(self.registry.pending, {})
+
+    def test_changes_while_writing_are_flushed(self):
+        write = self.registry.write
+
+        def write_then_disconnect(pending):
+            write(pending)
+            # a change the loop made while the write was running
+            self.registry.pending["alice"] = False
+
+        async def scenario():
+            self.registry.connect("alice", "tab1")
+            await self.registry.flush_task
+            self.assertEqual(self.registry.pending, {"alice": False})
+            self.registry.write = write
+            await self.registry.flush_task
+
+        self.registry.write = write_then_disconnect
+        async_to_sync(scenario)()
+        self.assertEqual(self.registry.pending, {})
+        self.assertEqual(self.registry.to_dict()["flushes"], 2)
+        self.assertFalse(User.objects.get(intra_id="alice").is_online)
+
+    def test_flush_on_shutdown(self):
+        self.registry.flush_delay = 60
+
+        async def scenario():
+            self.registry.connect("alice", "tab1")
+            await self.registry.shutdown()
+
+        async_to_sync(scenario)()
+        self.assertEqual(self.registry.pending, {})
+        self.assertTrue(User.objects.get(intra_id="alice").is_online)
+
+    def test_flap_is_suppressed(self):
+        self.registry.debounce = 0.05
+
+        async def scenario():
+            self.registry.connect("alice", "tab1")
+            self.registry.pending.clear()
+            # page reload: disconnect, then connect again within the window
+            going_offline = self.registry.disconnect("tab1", self.on_offline)
+            self.assertTrue(self.registry.is_online("alice"))
+            self.assertFalse(self.registry.connect("alice", "tab2"))
+            await asyncio.sleep(0.1)
+            self.assertTrue(going_offline.cancelled())
+            self.assertEqual(self.went_offline, [])
+            # closed for good
+            await self.registry.disconnect("tab2", self.on_offline)
+            self.assertFalse(self.registry.is_online("alice"))
+            self.assertEqual(self.registry.pending, {"alice": False})
+            await self.registry.flush_task
+
+        async_to_sync(scenario)()
+        self.assertFalse(User.objects.get(intra_id="alice").is_online)
+        self.assertEqual(self.registry.to_dict()["suppressed"], 2)
+        self.assertEqual(self.registry.to_dict()["offline"], 1)
+        self.assertEqual(self.went_offline, ["alice"])
+
+    def test_shutdown_within_debounce_persists_offline(self):
+        self.registry.debounce = 60
+
+        async def scenario():
+            self.registry.connect("alice", "tab1")
+            await self.registry.flush_task
+            going_offline = self.registry.disconnect("tab1", self.on_offline)
+            await self.registry.shutdown()
+            await asyncio.sleep(0)
+            self.assertTrue(going_offline.cancelled())
+
+        async_to_sync(scenario)()
+        self.assertFalse(User.objects.get(intra_id="alice").is_online)
+        self.assertEqual(self.went_offline, [])
@@ -0,0 +1,7 @@
+# Stand-in for socketio.AsyncServer in tests: records every emit
+class FakeServer:
+    def __init__(self):
+        self.emitted = []
+
+    async def emit(self, event, data=None, to=None, namespace=None, **kwargs):
+        self.emitted.append((event, data, to, namespace))
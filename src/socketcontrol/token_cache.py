@@ -0,0 +1,118 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Set, Tuple, Union
+
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from accounts.models import User
+
+logger = logging.getLogger(f"{__package__}.{__name__}")
+
+# password hash is not kept in memory, thus it is deferred on cached users
+USER_FIELD_NAMES: List[str] = [
+    field.attname for field in User._meta.concrete_fields if field.name != "password"
+]
+
+
+# Bounded LRU cache of validated access tokens, keyed by the sha256 of the token
+# (the token itself is never kept as a key).
+# Each entry holds the validated claims and the field values of the user, and
+# expires after `ttl` seconds or at the token's `exp`, whichever comes first.
+# Users are rebuilt from the values on every hit: they are up to `ttl` seconds
+# stale and should be saved with update_fields only.
+class TokenUserCache:
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict[str, Tuple[float, dict, tuple]] = OrderedDict()
+        self.intra_id_to_keys: Dict[str, Set[str]] = {}
+        # sync views (i.e. logout) run in worker threads
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def get_key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Union[None, Tuple[dict, User]]:
+        key = self.get_key(token)
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, claims, values = entry
+            if expires_at <= time.time():
+                self.misses += 1
+                self.remove(key)
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return claims, User.from_db("default", USER_FIELD_NAMES, values)
+
+    def put(self, token: str, claims: dict, user: User) -> None:
+        if self.max_size <= 0:
+            return
+        key = self.get_key(token)
+        expires_at = min(time.time() + self.ttl, claims.get("exp", float("inf")))
+        values = tuple(getattr(user, name) for name in USER_FIELD_NAMES)
+        with self.lock:
+            self.remove(key)
+            self.entries[key] = (expires_at, claims, values)
+            self.intra_id_to_keys.setdefault(user.intra_id, set()).add(key)
+            while len(self.entries) > self.max_size:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    # lock must be held
+    def remove(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        intra_id = entry[1].get("intra_id", None)
+        keys = self.intra_id_to_keys.get(intra_id, set())
+        keys.discard(key)
+        if not keys:
+            self.intra_id_to_keys.pop(intra_id, None)
+
+    def invalidate_token(self, token: str) -> None:
+        with self.lock:
+            self.remove(self.get_key(token))
+
+    def invalidate_user(self, intra_id: str) -> None:
+        with self.lock:
+            for key in list(self.intra_id_to_keys.get(intra_id, ())):
+                self.remove(key)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.intra_id_to_keys.clear()
+
+    def to_dict(self) -> dict:
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+TOKEN_USER_CACHE = TokenUserCache(
+    max_size=int(os.environ.get("TOKEN_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("TOKEN_CACHE_TTL", "300")),
+)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    TOKEN_USER_CACHE.invalidate_user(instance.intra_id)